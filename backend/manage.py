@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+
+from pymongo.errors import OperationFailure
+
+from server import (
+    client, db, ensure_indexes, check_indexes, repair_rollups, prune_unplanned_tasks,
+    task_repository, TASK_STORAGE_ENGINES
+)
+
+
+async def run_indexes(args) -> int:
+    if args.check:
+        report = await check_indexes()
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return 1 if report["missing"] else 0
+
+    await ensure_indexes()
+    print("Indexler oluşturuldu")
+    return 0
+
+
+async def run_repair_rollups(args) -> int:
+    query = {"tenant_id": args.tenant} if args.tenant else {}
+    cursor = db.projects.find(query, {"id": 1, "_id": 0}).batch_size(args.batch_size)
+
+    repaired = 0
+    batch = []
+    async for project in cursor:
+        batch.append(project["id"])
+        if len(batch) >= args.batch_size:
+            await repair_rollups(batch)
+            repaired += len(batch)
+            batch = []
+    if batch:
+        await repair_rollups(batch)
+        repaired += len(batch)
+
+    print(f"{repaired} projenin sayaçları yeniden hesaplandı")
+    return 0
+
+
+async def run_prune_tasks(args) -> int:
+    tenant_ids = [args.tenant] if args.tenant else await db.tenants.distinct("id")
+
+    total = 0
+    for tenant_id in tenant_ids:
+        pruned = await prune_unplanned_tasks(tenant_id, dry_run=args.dry_run)
+        if pruned:
+            print(f"{tenant_id}: {pruned} görev")
+        total += pruned
+
+    action = "silinecek" if args.dry_run else "silindi"
+    print(f"Toplam {total} gereksiz görev {action}")
+    return 0
+
+
+async def run_migrate_tasks(args) -> int:
+    query = {"task_storage": {"$ne": "packed"}} if args.to == "packed" else {"task_storage": "packed"}
+    if args.tenant:
+        query["tenant_id"] = args.tenant
+    if args.project:
+        query["project_id"] = args.project
+
+    areas = await db.project_areas.find(query, {"_id": 0}).to_list(None)
+    migrated = 0
+    failed = 0
+    project_ids = set()
+    for area in areas:
+        try:
+            migrated += await task_repository.migrate_area(area, args.to)
+        except RuntimeError as e:
+            # The source is left untouched; report and move on to the next area
+            print(e, file=sys.stderr)
+            failed += 1
+            continue
+        project_ids.add(area["project_id"])
+    if project_ids:
+        await repair_rollups(list(project_ids))
+
+    print(f"{len(areas) - failed} alanın {migrated} görevi '{args.to}' depolamasına taşındı")
+    if failed:
+        print(f"{failed} alan taşınamadı", file=sys.stderr)
+    return 1 if failed else 0
+
+
+async def collection_stats(name: str) -> dict:
+    try:
+        stats = await db.command("collStats", name)
+    except OperationFailure:
+        stats = {}
+    return {
+        "count": stats.get("count", 0),
+        "size": stats.get("size", 0),
+        "storage_size": stats.get("storageSize", 0),
+        "index_size": stats.get("totalIndexSize", 0),
+        "avg_obj_size": stats.get("avgObjSize", 0)
+    }
+
+
+async def run_benchmark_tasks(args) -> int:
+    base_query = {"tenant_id": args.tenant} if args.tenant else {}
+    report = {
+        "project_tasks": await collection_stats("project_tasks"),
+        "area_task_packs": await collection_stats("area_task_packs"),
+        "read_latency": {}
+    }
+
+    for storage in TASK_STORAGE_ENGINES:
+        storage_query = {"task_storage": "packed"} if storage == "packed" else {"task_storage": {"$ne": "packed"}}
+        areas = await db.project_areas.aggregate([
+            {"$match": {**base_query, **storage_query}},
+            {"$sample": {"size": args.samples}},
+            {"$project": {"_id": 0, "id": 1, "project_id": 1, "tenant_id": 1}}
+        ]).to_list(None)
+
+        timings = []
+        task_counts = []
+        for area in areas:
+            for _ in range(args.iterations):
+                started = time.perf_counter()
+                tasks = await task_repository.list(area["project_id"], area["tenant_id"], area["id"])
+                timings.append((time.perf_counter() - started) * 1000)
+            task_counts.append(len(tasks))
+
+        report["read_latency"][storage] = {
+            "areas": len(areas),
+            "avg_tasks": round(statistics.mean(task_counts), 1) if task_counts else 0,
+            "mean_ms": round(statistics.mean(timings), 2) if timings else None,
+            "p95_ms": round(statistics.quantiles(timings, n=20)[-1], 2) if len(timings) >= 2 else None
+        }
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="CraftForge bakım komutları")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    indexes = commands.add_parser("indexes", help="Index kayıt defterini uygula veya denetle")
+    indexes.add_argument("--check", action="store_true", help="Eksik ve kullanılmayan indexleri raporla")
+    indexes.set_defaults(handler=run_indexes)
+
+    rollups = commands.add_parser("repair-rollups", help="Proje ve alan sayaçlarını kaynaktan yeniden hesapla")
+    rollups.add_argument("--tenant", help="Sadece bu firmanın projeleri")
+    rollups.add_argument("--batch-size", type=int, default=200)
+    rollups.set_defaults(handler=run_repair_rollups)
+
+    prune = commands.add_parser("prune-tasks", help="İş kalemi alt görev ayarlarına göre gereksiz görevleri sil")
+    prune.add_argument("--tenant", help="Sadece bu firma")
+    prune.add_argument("--dry-run", action="store_true", help="Silmeden sadece say")
+    prune.set_defaults(handler=run_prune_tasks)
+
+    migrate = commands.add_parser("migrate-tasks", help="Alan görevlerini depolama motorları arasında taşı (bakım penceresinde çalıştırın)")
+    migrate.add_argument("--to", choices=TASK_STORAGE_ENGINES, required=True)
+    migrate.add_argument("--tenant", help="Sadece bu firma")
+    migrate.add_argument("--project", help="Sadece bu proje")
+    migrate.set_defaults(handler=run_migrate_tasks)
+
+    benchmark = commands.add_parser("benchmark-tasks", help="Görev depolama motorlarını boyut ve okuma süresine göre karşılaştır")
+    benchmark.add_argument("--tenant", help="Sadece bu firmanın alanları")
+    benchmark.add_argument("--samples", type=int, default=20, help="Motor başına örnek alan sayısı")
+    benchmark.add_argument("--iterations", type=int, default=5)
+    benchmark.set_defaults(handler=run_benchmark_tasks)
+
+    args = parser.parse_args()
+    try:
+        return asyncio.run(args.handler(args))
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
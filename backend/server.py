@@ -1,8 +1,10 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, UploadFile, File, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, UploadFile, File, WebSocket, WebSocketDisconnect, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import IndexModel, UpdateOne, ASCENDING, DESCENDING, ReturnDocument
+from pymongo.errors import OperationFailure
 import os
 import logging
 from pathlib import Path
@@ -14,7 +16,16 @@ import jwt
 import bcrypt
 import json
 import asyncio
-from fastapi.responses import FileResponse
+import time
+import hmac
+import hashlib
+import secrets
+import base64
+import re
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from fastapi.responses import FileResponse, StreamingResponse
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -27,10 +38,70 @@ db = client[os.environ['DB_NAME']]
 # JWT Settings
 JWT_SECRET = os.environ.get('JWT_SECRET', 'craftforge-secret-key-2024')
 JWT_ALGORITHM = "HS256"
-JWT_EXPIRATION_HOURS = 24
+JWT_ACCESS_EXPIRATION_MINUTES = int(os.environ.get('JWT_ACCESS_EXPIRATION_MINUTES', '30'))
+REFRESH_TOKEN_EXPIRATION_DAYS = int(os.environ.get('REFRESH_TOKEN_EXPIRATION_DAYS', '30'))
+# A token rotated this recently may be presented again (parallel tabs) without counting as reuse
+REFRESH_REUSE_GRACE_SECONDS = float(os.environ.get('REFRESH_REUSE_GRACE_SECONDS', '10'))
+# Embed resolved permissions in tokens so most requests skip the user/role lookup
+JWT_EMBED_CLAIMS = os.environ.get('JWT_EMBED_CLAIMS', 'false').lower() == 'true'
+
+# Task storage: "eager" inserts every planned task up front, "lazy" only persists
+# a task once it is first changed and derives the rest from the area's plan
+TASK_MATERIALIZATION = os.environ.get('TASK_MATERIALIZATION', 'eager')
+# Storage engine for new areas: "documents" (one row per task) or "packed" (one row per area)
+TASK_STORAGE = os.environ.get('TASK_STORAGE', 'documents')
+
+# Pagination settings
+PROJECTS_PAGE_SIZE = int(os.environ.get('PROJECTS_PAGE_SIZE', '100'))
+PAYMENTS_PAGE_SIZE = int(os.environ.get('PAYMENTS_PAGE_SIZE', '100'))
+ACTIVITIES_PAGE_SIZE = int(os.environ.get('ACTIVITIES_PAGE_SIZE', '50'))
+MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE', '500'))
+# Cursor batch size for streamed exports; bounds memory regardless of project size
+TASK_EXPORT_BATCH_SIZE = int(os.environ.get('TASK_EXPORT_BATCH_SIZE', '500'))
+# Upper bound on tasks changed by a single bulk update request
+MAX_TASK_BATCH = int(os.environ.get('MAX_TASK_BATCH', '500'))
+
+# Principal cache settings
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.environ.get('PRINCIPAL_CACHE_TTL_SECONDS', '60'))
+PRINCIPAL_CACHE_MAX_SIZE = int(os.environ.get('PRINCIPAL_CACHE_MAX_SIZE', '5000'))
+
+# Project detail cache settings
+PROJECT_CACHE_TTL_SECONDS = float(os.environ.get('PROJECT_CACHE_TTL_SECONDS', '300'))
+PROJECT_CACHE_MAX_ENTRIES = int(os.environ.get('PROJECT_CACHE_MAX_ENTRIES', '1000'))
+PROJECT_CACHE_MAX_BYTES = int(os.environ.get('PROJECT_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+
+# Tenant catalog cache settings
+CATALOG_CACHE_TTL_SECONDS = float(os.environ.get('CATALOG_CACHE_TTL_SECONDS', '300'))
+CATALOG_CACHE_MAX_TENANTS = int(os.environ.get('CATALOG_CACHE_MAX_TENANTS', '1000'))
+FINANCE_REPORT_TTL_SECONDS = float(os.environ.get('FINANCE_REPORT_TTL_SECONDS', '300'))
+FINANCE_REPORT_MAX_TENANTS = int(os.environ.get('FINANCE_REPORT_MAX_TENANTS', '1000'))
+USER_DIRECTORY_TTL_SECONDS = float(os.environ.get('USER_DIRECTORY_TTL_SECONDS', '300'))
+USER_DIRECTORY_MAX_TENANTS = int(os.environ.get('USER_DIRECTORY_MAX_TENANTS', '1000'))
+# Unknown ids (e.g. users created on another worker) reload the directory at most this often
+USER_DIRECTORY_RELOAD_SECONDS = float(os.environ.get('USER_DIRECTORY_RELOAD_SECONDS', '5'))
+
+# Password hashing pool settings ("thread" or "process")
+PASSWORD_POOL_KIND = os.environ.get('PASSWORD_POOL_KIND', 'thread')
+PASSWORD_POOL_WORKERS = int(os.environ.get('PASSWORD_POOL_WORKERS', '4'))
+PASSWORD_POOL_MAX_QUEUE = int(os.environ.get('PASSWORD_POOL_MAX_QUEUE', '64'))
+
+# Activity write-behind: "buffered" batches inserts off the request path, "durable" writes inline
+ACTIVITY_WRITE_MODE = os.environ.get('ACTIVITY_WRITE_MODE', 'buffered')
+ACTIVITY_BATCH_SIZE = int(os.environ.get('ACTIVITY_BATCH_SIZE', '200'))
+ACTIVITY_FLUSH_INTERVAL_SECONDS = float(os.environ.get('ACTIVITY_FLUSH_INTERVAL_SECONDS', '0.25'))
+ACTIVITY_MAX_QUEUE = int(os.environ.get('ACTIVITY_MAX_QUEUE', '10000'))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await ensure_indexes()
+    activity_writer.start()
+    yield
+    await activity_writer.shutdown()
+    password_pool.shutdown()
+    client.close()
 
 # Create the main app
-app = FastAPI(title="CraftForge - Marangoz Proje Yönetimi")
+app = FastAPI(title="CraftForge - Marangoz Proje Yönetimi", lifespan=lifespan)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -45,6 +116,7 @@ class UserRegister(BaseModel):
     password: str
     full_name: str
     tenant_name: Optional[str] = None
+    template: Optional[str] = None
 
 class UserLogin(BaseModel):
     email: EmailStr
@@ -64,9 +136,20 @@ class UserResponse(BaseModel):
 
 class TokenResponse(BaseModel):
     access_token: str
+    refresh_token: Optional[str] = None
     token_type: str = "bearer"
+    expires_in: int = JWT_ACCESS_EXPIRATION_MINUTES * 60
     user: UserResponse
 
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+class RefreshResponse(BaseModel):
+    access_token: str
+    refresh_token: str
+    token_type: str = "bearer"
+    expires_in: int = JWT_ACCESS_EXPIRATION_MINUTES * 60
+
 # Tenant Models
 class TenantCreate(BaseModel):
     name: str
@@ -93,6 +176,7 @@ class TenantUpdate(BaseModel):
     light_logo_url: Optional[str] = None
     dark_logo_url: Optional[str] = None
     setup_completed: Optional[bool] = None
+    task_fallback_policy: Optional[str] = None
 
 class TenantResponse(BaseModel):
     id: str
@@ -107,8 +191,32 @@ class TenantResponse(BaseModel):
     light_logo_url: Optional[str] = None
     dark_logo_url: Optional[str] = None
     setup_completed: bool = False
+    task_fallback_policy: str = "all"
     created_at: str
 
+class TenantTemplateGroup(BaseModel):
+    name: str
+    description: Optional[str] = None
+    order: int = 0
+    subtasks: List[str] = []
+
+class TenantTemplateCreate(BaseModel):
+    key: str
+    name: str
+    description: Optional[str] = None
+    groups: List[TenantTemplateGroup] = []
+    workitems: List[str] = []
+
+class TenantTemplateResponse(BaseModel):
+    key: str
+    name: str
+    description: Optional[str] = None
+    groups: List[TenantTemplateGroup] = []
+    workitems: List[str] = []
+    builtin: bool = False
+    created_by_tenant_id: Optional[str] = None
+    created_at: Optional[str] = None
+
 # Role & Permission Models
 class PermissionCreate(BaseModel):
     key: str
@@ -304,6 +412,15 @@ class ProjectTaskUpdate(BaseModel):
     notes: Optional[str] = None
     assigned_to: Optional[str] = None
 
+class ProjectTaskChange(BaseModel):
+    id: str
+    status: Optional[str] = None
+    notes: Optional[str] = None
+    assigned_to: Optional[str] = None
+
+class ProjectTaskBulkUpdate(BaseModel):
+    tasks: List[ProjectTaskChange]
+
 class ProjectTaskResponse(BaseModel):
     id: str
     project_id: str
@@ -370,45 +487,354 @@ class UserUpdate(BaseModel):
     role_id: Optional[str] = None
     color: Optional[str] = None
 
+# ==================== CACHES ====================
+
+class TTLCache:
+    def __init__(self, ttl_seconds: float, max_size: int, max_bytes: Optional[int] = None):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Any, tuple]" = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, value, _ = entry
+        if expires_at <= time.monotonic():
+            self.pop(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value, size: int = 0):
+        self.pop(key)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value, size)
+        self.bytes += size
+        while len(self._entries) > self.max_size or (self.max_bytes is not None and self.bytes > self.max_bytes):
+            _, (_, _, evicted_size) = self._entries.popitem(last=False)
+            self.bytes -= evicted_size
+            self.evictions += 1
+
+    def pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[2]
+
+    def pop_where(self, predicate):
+        stale_keys = [k for k, (_, v, _) in self._entries.items() if predicate(v)]
+        for k in stale_keys:
+            self.pop(k)
+        return len(stale_keys)
+
+    def clear(self):
+        self._entries.clear()
+        self.bytes = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        stats = {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": (self.hits / lookups) if lookups > 0 else 0
+        }
+        if self.max_bytes is not None:
+            stats["bytes"] = self.bytes
+            stats["max_bytes"] = self.max_bytes
+        return stats
+
+# user_id -> user document (without password) plus resolved permissions
+principal_cache = TTLCache(PRINCIPAL_CACHE_TTL_SECONDS, PRINCIPAL_CACHE_MAX_SIZE)
+
+class VersionTable:
+    def __init__(self):
+        # Versions live in memory only; a new epoch per process means tokens
+        # stamped by an earlier process are never trusted blindly.
+        self.epoch = str(uuid.uuid4())
+        self._versions: Dict[str, int] = {}
+
+    def get(self, key: str) -> int:
+        return self._versions.get(key, 0)
+
+    def bump(self, key: str) -> int:
+        self._versions[key] = self.get(key) + 1
+        return self._versions[key]
+
+principal_versions = VersionTable()
+embedded_claim_stats = {"accepted": 0, "stale": 0}
+
+# project_id -> (version, tenant_id, detail payload); any project write bumps the version
+project_versions = VersionTable()
+project_detail_cache = TTLCache(PROJECT_CACHE_TTL_SECONDS, PROJECT_CACHE_MAX_ENTRIES, PROJECT_CACHE_MAX_BYTES)
+
+def touch_project(project_id: str):
+    project_versions.bump(project_id)
+    project_detail_cache.pop(project_id)
+
+# tenant_id -> snapshot of groups, subtasks and work items used to fan out area tasks
+catalog_versions = VersionTable()
+catalog_cache = TTLCache(CATALOG_CACHE_TTL_SECONDS, CATALOG_CACHE_MAX_TENANTS)
+
+def invalidate_tenant_catalog(tenant_id: str):
+    catalog_versions.bump(tenant_id)
+    catalog_cache.pop(tenant_id)
+
+# tenant_id -> {"users": {user_id: {"full_name", "color"}}, "loaded_at"} for display names in listings
+directory_versions = VersionTable()
+user_directory_cache = TTLCache(USER_DIRECTORY_TTL_SECONDS, USER_DIRECTORY_MAX_TENANTS)
+
+def invalidate_user_directory(tenant_id: str):
+    directory_versions.bump(tenant_id)
+    user_directory_cache.pop(tenant_id)
+
+# tenant_id -> finance report payload; any payment, area price or project write drops it
+finance_versions = VersionTable()
+finance_report_cache = TTLCache(FINANCE_REPORT_TTL_SECONDS, FINANCE_REPORT_MAX_TENANTS)
+
+def invalidate_finance_report(tenant_id: str):
+    finance_versions.bump(tenant_id)
+    finance_report_cache.pop(tenant_id)
+
+def invalidate_user_principal(user_id: str):
+    principal_cache.pop(user_id)
+    principal_versions.bump(f"user:{user_id}")
+
+def invalidate_role_principals(role_id: str):
+    principal_cache.pop_where(lambda u: u.get("role_id") == role_id)
+    principal_versions.bump(f"role:{role_id}")
+
 # ==================== HELPER FUNCTIONS ====================
 
-def hash_password(password: str) -> str:
+def _bcrypt_hash(password: str) -> str:
     return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
 
-def verify_password(password: str, hashed: str) -> bool:
+def _bcrypt_verify(password: str, hashed: str) -> bool:
     return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
 
-def create_token(user_id: str, tenant_id: str) -> str:
+class PasswordHashPool:
+    def __init__(self, kind: str, workers: int, max_queue: int):
+        self.kind = kind
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = None
+        self._slots = None
+        self.in_flight = 0
+        self.waiting = 0
+        self.peak_waiting = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def _get_executor(self):
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    async def run(self, fn, *args):
+        if self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Sunucu şu anda yoğun, lütfen tekrar deneyin",
+                headers={"Retry-After": "1"}
+            )
+        
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.workers)
+        
+        self.waiting += 1
+        self.peak_waiting = max(self.peak_waiting, self.waiting)
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        
+        self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            self._slots.release()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "kind": self.kind,
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queue_depth": self.waiting,
+            "peak_queue_depth": self.peak_waiting,
+            "completed": self.completed,
+            "rejected": self.rejected
+        }
+
+password_pool = PasswordHashPool(PASSWORD_POOL_KIND, PASSWORD_POOL_WORKERS, PASSWORD_POOL_MAX_QUEUE)
+
+async def hash_password(password: str) -> str:
+    return await password_pool.run(_bcrypt_hash, password)
+
+async def verify_password(password: str, hashed: str) -> bool:
+    return await password_pool.run(_bcrypt_verify, password, hashed)
+
+def create_token(user: dict, permissions: Optional[List[str]] = None) -> str:
     payload = {
-        "user_id": user_id,
-        "tenant_id": tenant_id,
-        "exp": datetime.now(timezone.utc) + timedelta(hours=JWT_EXPIRATION_HOURS)
+        "user_id": user["id"],
+        "tenant_id": user["tenant_id"],
+        "exp": datetime.now(timezone.utc) + timedelta(minutes=JWT_ACCESS_EXPIRATION_MINUTES)
     }
+    
+    if JWT_EMBED_CLAIMS and permissions is not None:
+        role_id = user.get("role_id")
+        payload["claims"] = {
+            "email": user["email"],
+            "full_name": user["full_name"],
+            "role_id": role_id,
+            "color": user.get("color", "#4a4036"),
+            "is_admin": user.get("is_admin", False),
+            "created_at": user["created_at"],
+            "permissions": permissions,
+            "epoch": principal_versions.epoch,
+            "uv": principal_versions.get(f"user:{user['id']}"),
+            "rv": principal_versions.get(f"role:{role_id}") if role_id else 0
+        }
+    
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
+def hash_refresh_token(refresh_token: str) -> str:
+    return hmac.new(JWT_SECRET.encode('utf-8'), refresh_token.encode('utf-8'), hashlib.sha256).hexdigest()
+
+async def create_session(user: dict, family_id: Optional[str] = None) -> str:
+    refresh_token = secrets.token_urlsafe(48)
+    now = datetime.now(timezone.utc)
+    
+    await db.sessions.insert_one({
+        "id": str(uuid.uuid4()),
+        "family_id": family_id or str(uuid.uuid4()),
+        "user_id": user["id"],
+        "tenant_id": user["tenant_id"],
+        "token_hash": hash_refresh_token(refresh_token),
+        "revoked": False,
+        "expires_at": now + timedelta(days=REFRESH_TOKEN_EXPIRATION_DAYS),
+        "created_at": now.isoformat()
+    })
+    return refresh_token
+
+def principal_from_claims(payload: dict) -> Optional[dict]:
+    claims = payload.get("claims")
+    if not claims:
+        return None
+    
+    role_id = claims.get("role_id")
+    is_current = (
+        claims.get("epoch") == principal_versions.epoch
+        and claims.get("uv") == principal_versions.get(f"user:{payload['user_id']}")
+        and claims.get("rv") == (principal_versions.get(f"role:{role_id}") if role_id else 0)
+    )
+    if not is_current:
+        embedded_claim_stats["stale"] += 1
+        return None
+    
+    embedded_claim_stats["accepted"] += 1
+    return {
+        "id": payload["user_id"],
+        "tenant_id": payload["tenant_id"],
+        "email": claims["email"],
+        "full_name": claims["full_name"],
+        "role_id": role_id,
+        "color": claims.get("color", "#4a4036"),
+        "is_admin": claims.get("is_admin", False),
+        "created_at": claims["created_at"],
+        "permissions": claims.get("permissions", [])
+    }
+
+async def load_principal(user_id: str) -> Optional[dict]:
+    principal = principal_cache.get(user_id)
+    if principal is not None:
+        return principal
+    
+    user = await db.users.find_one({"id": user_id}, {"_id": 0, "password": 0})
+    if not user:
+        return None
+    
+    permissions = []
+    if user.get("is_admin"):
+        permissions = ["*"]
+    elif user.get("role_id"):
+        role = await db.roles.find_one({"id": user["role_id"]}, {"permissions": 1, "_id": 0})
+        if role:
+            permissions = role.get("permissions", [])
+    
+    user["permissions"] = permissions
+    principal_cache.set(user_id, user)
+    return user
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     try:
         payload = jwt.decode(credentials.credentials, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        user = await db.users.find_one({"id": payload["user_id"]}, {"_id": 0})
+        
+        if JWT_EMBED_CLAIMS:
+            claimed_user = principal_from_claims(payload)
+            if claimed_user:
+                return claimed_user
+        
+        user = await load_principal(payload["user_id"])
         if not user:
             raise HTTPException(status_code=401, detail="Kullanıcı bulunamadı")
         
-        permissions = []
-        if user.get("is_admin"):
-            permissions = ["*"]
-        elif user.get("role_id"):
-            role = await db.roles.find_one({"id": user["role_id"]}, {"permissions": 1, "_id": 0})
-            if role:
-                permissions = role.get("permissions", [])
-        
-        user["permissions"] = permissions
-        return user
+        return {**user, "permissions": list(user["permissions"])}
         
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token süresi dolmuş")
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Geçersiz token")
 
+def compute_progress(completed: int, total: int) -> float:
+    return (completed / total * 100) if total > 0 else 0
+
+def encode_cursor(*values) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(values)).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor: str, size: int) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, UnicodeError):
+        values = None
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=400, detail="Geçersiz sayfa imleci")
+    return values
+
+def keyset_condition(field: str, value, last_id: str) -> dict:
+    # Descending (field, id) order: rows strictly after the cursor row
+    return {"$or": [
+        {field: {"$lt": value}},
+        {field: value, "id": {"$lt": last_id}}
+    ]}
+
+def clamp_page_size(limit: int) -> int:
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
 def check_permission(user: dict, permission: str):
     if user.get("is_admin"):
         return True
@@ -478,9 +904,9 @@ class ConnectionManager:
 
 manager = ConnectionManager()
 
-async def create_notification(user_id: str, tenant_id: str, title: str, message: str, 
-                            notification_type: str = "info", link: str = None):
-    notification = {
+def build_notification(user_id: str, tenant_id: str, title: str, message: str,
+                       notification_type: str = "info", link: str = None) -> dict:
+    return {
         "id": str(uuid.uuid4()),
         "user_id": user_id,
         "tenant_id": tenant_id,
@@ -491,27 +917,32 @@ async def create_notification(user_id: str, tenant_id: str, title: str, message:
         "is_read": False,
         "created_at": datetime.now(timezone.utc).isoformat()
     }
-    await db.notifications.insert_one(notification)
-    
-    await manager.send_to_user(user_id, {
+
+async def push_notification(notification: dict):
+    await manager.send_to_user(notification["user_id"], {
         "type": "notification",
         "data": {k: v for k, v in notification.items() if k != "_id"}
     })
-    
+
+async def create_notification(user_id: str, tenant_id: str, title: str, message: str, 
+                            notification_type: str = "info", link: str = None):
+    notification = build_notification(user_id, tenant_id, title, message, notification_type, link)
+    await db.notifications.insert_one(notification)
+    await push_notification(notification)
     return notification
 
-async def log_project_activity(
-    project_id: str, 
+def build_activity(
+    project_id: str,
     tenant_id: str,
     user_id: str,
     user_name: str,
-    action: str, 
+    action: str,
     description: str,
     area_id: str = None,
     area_name: str = None,
     metadata: dict = None
-):
-    activity = {
+) -> dict:
+    return {
         "id": str(uuid.uuid4()),
         "project_id": project_id,
         "tenant_id": tenant_id,
@@ -524,9 +955,296 @@ async def log_project_activity(
         "metadata": metadata or {},
         "created_at": datetime.now(timezone.utc).isoformat()
     }
-    await db.project_activities.insert_one({k: v for k, v in activity.items() if k != "_id"})
+
+class ActivityWriter:
+    def __init__(self, mode: str, batch_size: int, flush_interval: float, max_queue: int):
+        self.mode = mode
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self._queue = None
+        self._task = None
+        self._stopping = False
+        # Buffered but not yet flushed activities per tenant, so readers only wait when they must
+        self._pending: Dict[str, int] = {}
+        self.peak_queue_depth = 0
+        self.blocked = 0
+        self.flushes = 0
+        self.written = 0
+        self.failed = 0
+        self.syncs = 0
+
+    def start(self):
+        if self.mode != "buffered" or self._task is not None:
+            return
+        self._queue = asyncio.Queue(self.max_queue)
+        self._task = asyncio.create_task(self._run())
+
+    async def write(self, activities: List[dict], durable: bool = False):
+        # Copies keep the _id that insert_many adds off the caller's documents
+        docs = [dict(a) for a in activities]
+        if durable or self._task is None:
+            if docs:
+                await db.project_activities.insert_many(docs)
+            return
+        
+        for doc in docs:
+            if self._queue.full():
+                # Backpressure: the request waits for the flusher instead of growing memory
+                self.blocked += 1
+            self._pending[doc["tenant_id"]] = self._pending.get(doc["tenant_id"], 0) + 1
+            await self._queue.put(doc)
+            self.peak_queue_depth = max(self.peak_queue_depth, self._queue.qsize())
+
+    async def sync(self, tenant_id: str):
+        # Read-your-writes: a reader waits until the tenant's buffered activities are in the collection
+        if self._task is None or self._stopping or not self._pending.get(tenant_id):
+            return
+        self.syncs += 1
+        barrier = asyncio.get_running_loop().create_future()
+        await self._queue.put(barrier)
+        await barrier
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+            batch, barriers = [], []
+            (barriers if isinstance(item, asyncio.Future) else batch).append(item)
+            deadline = loop.time() + self.flush_interval
+            stopping = False
+            # A barrier ends the batch early so the waiting reader is released right after the flush
+            while not barriers and len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                (barriers if isinstance(item, asyncio.Future) else batch).append(item)
+            if batch:
+                await self._flush(batch)
+            for barrier in barriers:
+                if not barrier.done():
+                    barrier.set_result(None)
+            if stopping:
+                return
+
+    async def _flush(self, batch: List[dict]):
+        try:
+            await db.project_activities.insert_many(batch, ordered=False)
+            self.written += len(batch)
+        except Exception as e:
+            self.failed += len(batch)
+            logger.error(f"Proje aktiviteleri yazılamadı ({len(batch)} kayıt): {e}")
+        for doc in batch:
+            self._pending[doc["tenant_id"]] -= 1
+            if not self._pending[doc["tenant_id"]]:
+                del self._pending[doc["tenant_id"]]
+        self.flushes += 1
+
+    async def shutdown(self):
+        if self._task is None:
+            return
+        # The sentinel queues behind everything already buffered, so all of it is flushed
+        self._stopping = True
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "peak_queue_depth": self.peak_queue_depth,
+            "blocked": self.blocked,
+            "flushes": self.flushes,
+            "written": self.written,
+            "failed": self.failed,
+            "syncs": self.syncs
+        }
+
+activity_writer = ActivityWriter(ACTIVITY_WRITE_MODE, ACTIVITY_BATCH_SIZE, ACTIVITY_FLUSH_INTERVAL_SECONDS, ACTIVITY_MAX_QUEUE)
+
+async def log_project_activity(
+    project_id: str, 
+    tenant_id: str,
+    user_id: str,
+    user_name: str,
+    action: str, 
+    description: str,
+    area_id: str = None,
+    area_name: str = None,
+    metadata: dict = None,
+    durable: bool = False
+):
+    activity = build_activity(project_id, tenant_id, user_id, user_name, action, description, area_id, area_name, metadata)
+    await activity_writer.write([activity], durable=durable)
     return activity
 
+# ==================== TRANSACTIONS ====================
+
+transaction_support = {"available": None}
+
+async def insert_documents_atomically(documents: Dict[str, List[dict]]):
+    async def write(session=None):
+        for collection, docs in documents.items():
+            if docs:
+                await db[collection].insert_many(docs, session=session)
+    
+    if transaction_support["available"] is not False:
+        try:
+            async with await client.start_session() as session:
+                await session.with_transaction(write)
+            transaction_support["available"] = True
+            return
+        except OperationFailure as e:
+            # IllegalOperation: standalone server without replica set
+            if e.code != 20:
+                raise
+            transaction_support["available"] = False
+            logger.warning("MongoDB transactions unavailable, falling back to compensating writes")
+    
+    try:
+        await write()
+    except Exception:
+        # insert_many assigns _id to every document up front, whatever its own key is
+        for collection, docs in documents.items():
+            inserted = [d["_id"] for d in docs if "_id" in d]
+            if inserted:
+                await db[collection].delete_many({"_id": {"$in": inserted}})
+        raise
+
+# ==================== INDEXES ====================
+
+def _index(name: str, keys: list, **options) -> IndexModel:
+    return IndexModel(keys, name=name, **options)
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    "tenants": [
+        _index("id_unique", [("id", ASCENDING)], unique=True),
+    ],
+    "users": [
+        _index("id_unique", [("id", ASCENDING)], unique=True),
+        _index("email_unique", [("email", ASCENDING)], unique=True),
+        _index("tenant", [("tenant_id", ASCENDING)]),
+    ],
+    "sessions": [
+        _index("token_hash_unique", [("token_hash", ASCENDING)], unique=True),
+        _index("family", [("family_id", ASCENDING)]),
+        _index("user", [("user_id", ASCENDING)]),
+        _index("expires_ttl", [("expires_at", ASCENDING)], expireAfterSeconds=0),
+    ],
+    "tenant_templates": [
+        _index("tenant_key_unique", [("created_by_tenant_id", ASCENDING), ("key", ASCENDING)], unique=True),
+    ],
+    "roles": [
+        _index("id_unique", [("id", ASCENDING)], unique=True),
+        _index("tenant", [("tenant_id", ASCENDING)]),
+    ],
+    "permissions": [
+        _index("tenant", [("tenant_id", ASCENDING)]),
+    ],
+    "groups": [
+        _index("id_unique", [("id", ASCENDING)], unique=True),
+        _index("tenant_order", [("tenant_id", ASCENDING), ("order", ASCENDING)]),
+    ],
+    "subtasks": [
+        _index("id_unique", [("id", ASCENDING)], unique=True),
+        _index("tenant_order", [("tenant_id", ASCENDING), ("order", ASCENDING)]),
+        _index("tenant_group_order", [("tenant_id", ASCENDING), ("group_id", ASCENDING), ("order", ASCENDING)]),
+    ],
+    "workitems": [
+        _index("id_unique", [("id", ASCENDING)], unique=True),
+        _index("tenant", [("tenant_id", ASCENDING)]),
+    ],
+    "projects": [
+        _index("id_unique", [("id", ASCENDING)], unique=True),
+        _index("tenant_created_id", [("tenant_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)]),
+        _index("tenant_status_created_id", [("tenant_id", ASCENDING), ("status", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)]),
+        _index("created_by", [("created_by", ASCENDING)]),
+    ],
+    "project_areas": [
+        _index("id_unique", [("id", ASCENDING)], unique=True),
+        _index("project", [("project_id", ASCENDING)]),
+        _index("tenant_city_district", [("tenant_id", ASCENDING), ("city", ASCENDING), ("district", ASCENDING)]),
+    ],
+    "project_tasks": [
+        _index("id_unique", [("id", ASCENDING)], unique=True),
+        _index("project_area", [("project_id", ASCENDING), ("area_id", ASCENDING)]),
+        _index("area_status", [("area_id", ASCENDING), ("status", ASCENDING)]),
+        _index("tenant_status", [("tenant_id", ASCENDING), ("status", ASCENDING)]),
+    ],
+    "area_task_packs": [
+        _index("area_unique", [("area_id", ASCENDING)], unique=True),
+        _index("project_ids", [("project_id", ASCENDING), ("ids", ASCENDING)]),
+    ],
+    "project_assignments": [
+        _index("id_unique", [("id", ASCENDING)], unique=True),
+        _index("project_user", [("project_id", ASCENDING), ("user_id", ASCENDING)]),
+        _index("user", [("user_id", ASCENDING)]),
+        _index("area", [("area_id", ASCENDING)]),
+    ],
+    "project_payments": [
+        _index("id_unique", [("id", ASCENDING)], unique=True),
+        _index("project_payment_date_id", [("project_id", ASCENDING), ("payment_date", DESCENDING), ("id", DESCENDING)]),
+        _index("area", [("area_id", ASCENDING)]),
+    ],
+    "project_activities": [
+        _index("project_created_id", [("project_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)]),
+        _index("tenant_created_id", [("tenant_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)]),
+        _index("tenant_action_created_id", [("tenant_id", ASCENDING), ("action", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)]),
+        _index("tenant_user_created_id", [("tenant_id", ASCENDING), ("user_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)]),
+        _index("tenant_area_created_id", [("tenant_id", ASCENDING), ("area_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)]),
+    ],
+    "notifications": [
+        _index("id_unique", [("id", ASCENDING)], unique=True),
+        _index("user_read_created", [("user_id", ASCENDING), ("is_read", ASCENDING), ("created_at", DESCENDING)]),
+        _index("user_created", [("user_id", ASCENDING), ("created_at", DESCENDING)]),
+    ],
+    "files": [
+        _index("id_unique", [("id", ASCENDING)], unique=True),
+        _index("tenant_project_created", [("tenant_id", ASCENDING), ("project_id", ASCENDING), ("created_at", DESCENDING)]),
+        _index("tenant_task", [("tenant_id", ASCENDING), ("task_id", ASCENDING)]),
+    ],
+}
+
+async def ensure_indexes():
+    for collection, models in INDEXES.items():
+        try:
+            await db[collection].create_indexes(models)
+        except OperationFailure as e:
+            logger.error(f"Index oluşturulamadı ({collection}): {e}")
+
+async def check_indexes() -> dict:
+    report = {"missing": [], "unused": [], "undeclared": []}
+    
+    for collection, models in INDEXES.items():
+        declared = {m.document["name"] for m in models}
+        existing = await db[collection].index_information()
+        
+        for name in sorted(declared - set(existing)):
+            report["missing"].append({"collection": collection, "index": name})
+        for name in sorted(set(existing) - declared - {"_id_"}):
+            report["undeclared"].append({"collection": collection, "index": name})
+        
+        stats = await db[collection].aggregate([{"$indexStats": {}}]).to_list(None)
+        for stat in stats:
+            if stat["name"] != "_id_" and stat.get("accesses", {}).get("ops", 0) == 0:
+                report["unused"].append({
+                    "collection": collection,
+                    "index": stat["name"],
+                    "since": stat.get("accesses", {}).get("since")
+                })
+    
+    return report
+
 # ==================== DEFAULT PERMISSIONS ====================
 
 DEFAULT_PERMISSIONS = [
@@ -550,115 +1268,170 @@ DEFAULT_PERMISSIONS = [
     {"key": "files.delete", "name": "Dosya Sil", "description": "Dosya silme yetkisi"},
 ]
 
-# ==================== AUTH ROUTES ====================
+# ==================== TENANT TEMPLATES ====================
+
+BUILTIN_TENANT_TEMPLATES = {
+    "default": {
+        "key": "default",
+        "name": "Marangoz Atölyesi",
+        "description": "Planlama, üretim, montaj ve kontrol aşamalarıyla standart kurulum",
+        "groups": [
+            {"name": "Planlama", "description": "Planlama aşaması", "order": 1,
+             "subtasks": ["Ölçü Alma", "Tasarım", "Malzeme Seçimi"]},
+            {"name": "Üretim", "description": "Üretim aşaması", "order": 2,
+             "subtasks": ["Kesim", "İşleme", "Montaj Öncesi Hazırlık"]},
+            {"name": "Montaj", "description": "Montaj aşaması", "order": 3,
+             "subtasks": ["Taşıma", "Yerleştirme", "Sabitleme"]},
+            {"name": "Kontrol", "description": "Kalite kontrol aşaması", "order": 4,
+             "subtasks": ["Görsel Kontrol", "İşlevsellik Testi", "Müşteri Onayı"]},
+        ],
+        "workitems": [],
+        "builtin": True
+    }
+}
 
-@api_router.post("/auth/register", response_model=TokenResponse)
-async def register(data: UserRegister):
-    existing = await db.users.find_one({"email": data.email})
-    if existing:
-        raise HTTPException(status_code=400, detail="Bu e-posta adresi zaten kayıtlı")
+async def get_tenant_template(key: str, tenant_id: Optional[str] = None) -> dict:
+    if key in BUILTIN_TENANT_TEMPLATES:
+        return BUILTIN_TENANT_TEMPLATES[key]
+    
+    # Custom templates belong to the tenant that created them; signups only see builtins
+    template = None
+    if tenant_id:
+        template = await db.tenant_templates.find_one({"key": key, "created_by_tenant_id": tenant_id}, {"_id": 0})
+    if not template:
+        raise HTTPException(status_code=400, detail="Kurulum şablonu bulunamadı")
+    return template
+
+def build_tenant_seed(template: dict, tenant_name: str) -> Dict[str, List[dict]]:
+    now = datetime.now(timezone.utc).isoformat()
+    tenant_id = str(uuid.uuid4())
+    
+    tenant = {
+        "id": tenant_id,
+        "name": tenant_name,
+        "city": None,
+        "district": None,
+        "address": None,
+        "contact_email": None,
+        "phone": None,
+        "tax_office": None,
+        "tax_number": None,
+        "light_logo_url": None,
+        "dark_logo_url": None,
+        "setup_completed": False,
+        "task_fallback_policy": "all",
+        "created_at": now
+    }
     
-    tenant_id = None
-    is_admin = False
+    permissions = [
+        {"id": str(uuid.uuid4()), "tenant_id": tenant_id, **perm}
+        for perm in DEFAULT_PERMISSIONS
+    ]
     
-    if data.tenant_name:
-        tenant = {
+    admin_role = {
+        "id": str(uuid.uuid4()),
+        "tenant_id": tenant_id,
+        "name": "Yönetici",
+        "description": "Tüm yetkilere sahip yönetici rolü",
+        "permissions": [p["key"] for p in DEFAULT_PERMISSIONS],
+        "created_at": now
+    }
+    
+    return {
+        "tenants": [tenant],
+        "permissions": permissions,
+        "roles": [admin_role],
+        **build_template_catalog(template, tenant_id),
+        "users": []
+    }
+
+def build_template_catalog(template: dict, tenant_id: str, skip_names: Optional[Dict[str, set]] = None) -> Dict[str, List[dict]]:
+    now = datetime.now(timezone.utc).isoformat()
+    skip_names = skip_names or {}
+    
+    groups = []
+    subtasks = []
+    for g in template.get("groups", []):
+        if g["name"] in skip_names.get("groups", set()):
+            continue
+        group = {
             "id": str(uuid.uuid4()),
-            "name": data.tenant_name,
-            "city": None,
-            "district": None,
-            "address": None,
-            "contact_email": None,
-            "phone": None,
-            "tax_office": None,
-            "tax_number": None,
-            "light_logo_url": None,
-            "dark_logo_url": None,
-            "setup_completed": False,
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "tenant_id": tenant_id,
+            "name": g["name"],
+            "description": g.get("description"),
+            "order": g.get("order", 0),
+            "created_at": now
         }
-        await db.tenants.insert_one(tenant)
-        tenant_id = tenant["id"]
-        is_admin = True
+        groups.append(group)
         
-        for perm in DEFAULT_PERMISSIONS:
-            await db.permissions.insert_one({
+        for idx, st_name in enumerate(g.get("subtasks", [])):
+            subtasks.append({
                 "id": str(uuid.uuid4()),
                 "tenant_id": tenant_id,
-                **perm
+                "group_id": group["id"],
+                "name": st_name,
+                "description": None,
+                "order": idx + 1,
+                "created_at": now
             })
-        
-        admin_role = {
+    
+    workitems = [
+        {
             "id": str(uuid.uuid4()),
             "tenant_id": tenant_id,
-            "name": "Yönetici",
-            "description": "Tüm yetkilere sahip yönetici rolü",
-            "permissions": [p["key"] for p in DEFAULT_PERMISSIONS],
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "name": wi_name,
+            "description": None,
+            "default_subtask_ids": [],
+            "created_at": now
         }
-        await db.roles.insert_one(admin_role)
-        
-        default_groups = [
-            {"name": "Planlama", "description": "Planlama aşaması", "order": 1},
-            {"name": "Üretim", "description": "Üretim aşaması", "order": 2},
-            {"name": "Montaj", "description": "Montaj aşaması", "order": 3},
-            {"name": "Kontrol", "description": "Kalite kontrol aşaması", "order": 4},
-        ]
-        for g in default_groups:
-            group = {
-                "id": str(uuid.uuid4()),
-                "tenant_id": tenant_id,
-                **g,
-                "created_at": datetime.now(timezone.utc).isoformat()
-            }
-            await db.groups.insert_one(group)
-            
-            default_subtasks = []
-            if g["name"] == "Planlama":
-                default_subtasks = ["Ölçü Alma", "Tasarım", "Malzeme Seçimi"]
-            elif g["name"] == "Üretim":
-                default_subtasks = ["Kesim", "İşleme", "Montaj Öncesi Hazırlık"]
-            elif g["name"] == "Montaj":
-                default_subtasks = ["Taşıma", "Yerleştirme", "Sabitleme"]
-            elif g["name"] == "Kontrol":
-                default_subtasks = ["Görsel Kontrol", "İşlevsellik Testi", "Müşteri Onayı"]
-            
-            for idx, st_name in enumerate(default_subtasks):
-                subtask = {
-                    "id": str(uuid.uuid4()),
-                    "tenant_id": tenant_id,
-                    "group_id": group["id"],
-                    "name": st_name,
-                    "description": None,
-                    "order": idx + 1,
-                    "created_at": datetime.now(timezone.utc).isoformat()
-                }
-                await db.subtasks.insert_one(subtask)
-    else:
+        for wi_name in template.get("workitems", [])
+        if wi_name not in skip_names.get("workitems", set())
+    ]
+    
+    return {"groups": groups, "subtasks": subtasks, "workitems": workitems}
+
+# ==================== AUTH ROUTES ====================
+
+@api_router.post("/auth/register", response_model=TokenResponse)
+async def register(data: UserRegister):
+    existing = await db.users.find_one({"email": data.email})
+    if existing:
+        raise HTTPException(status_code=400, detail="Bu e-posta adresi zaten kayıtlı")
+    
+    if not data.tenant_name:
         raise HTTPException(status_code=400, detail="Firma adı gereklidir")
     
+    template = await get_tenant_template(data.template or "default")
+    seed = build_tenant_seed(template, data.tenant_name)
+    tenant = seed["tenants"][0]
+    tenant_id = tenant["id"]
+    is_admin = True
+    
     user = {
         "id": str(uuid.uuid4()),
         "email": data.email,
-        "password": hash_password(data.password),
+        "password": await hash_password(data.password),
         "full_name": data.full_name,
         "tenant_id": tenant_id,
-        "role_id": admin_role["id"] if is_admin else None,
+        "role_id": seed["roles"][0]["id"],
         "color": "#4a4036",
         "is_admin": is_admin,
         "created_at": datetime.now(timezone.utc).isoformat()
     }
-    await db.users.insert_one(user)
+    seed["users"].append(user)
     
-    token = create_token(user["id"], tenant_id)
-    
-    tenant_doc = await db.tenants.find_one({"id": tenant_id}, {"setup_completed": 1, "_id": 0})
-    setup_completed = tenant_doc.get("setup_completed", False) if tenant_doc else False
+    await insert_documents_atomically(seed)
     
     permissions = ["*"] if is_admin else []
     
+    token = create_token(user, permissions)
+    refresh_token = await create_session(user)
+    
+    setup_completed = tenant["setup_completed"]
+    
     return TokenResponse(
         access_token=token,
+        refresh_token=refresh_token,
         user=UserResponse(
             id=user["id"],
             email=user["email"],
@@ -676,11 +1449,9 @@ async def register(data: UserRegister):
 @api_router.post("/auth/login", response_model=TokenResponse)
 async def login(data: UserLogin):
     user = await db.users.find_one({"email": data.email}, {"_id": 0})
-    if not user or not verify_password(data.password, user["password"]):
+    if not user or not await verify_password(data.password, user["password"]):
         raise HTTPException(status_code=401, detail="Geçersiz e-posta veya şifre")
     
-    token = create_token(user["id"], user["tenant_id"])
-    
     tenant_doc = await db.tenants.find_one({"id": user["tenant_id"]}, {"setup_completed": 1, "_id": 0})
     setup_completed = tenant_doc.get("setup_completed", False) if tenant_doc else False
     
@@ -691,9 +1462,13 @@ async def login(data: UserLogin):
         role = await db.roles.find_one({"id": user["role_id"]}, {"permissions": 1, "_id": 0})
         if role:
             permissions = role.get("permissions", [])
+    
+    token = create_token(user, permissions)
+    refresh_token = await create_session(user)
 
     return TokenResponse(
         access_token=token,
+        refresh_token=refresh_token,
         user=UserResponse(
             id=user["id"],
             email=user["email"],
@@ -708,6 +1483,54 @@ async def login(data: UserLogin):
         )
     )
 
+@api_router.post("/auth/refresh", response_model=RefreshResponse)
+async def refresh_session(data: RefreshRequest):
+    token_hash = hash_refresh_token(data.refresh_token)
+    now = datetime.now(timezone.utc)
+    
+    session = await db.sessions.find_one_and_update(
+        {"token_hash": token_hash, "revoked": False},
+        {"$set": {"revoked": True, "rotated_at": now.isoformat()}},
+        {"_id": 0}
+    )
+    if not session:
+        reused = await db.sessions.find_one({"token_hash": token_hash}, {"_id": 0})
+        if not reused:
+            raise HTTPException(status_code=401, detail="Geçersiz oturum")
+        
+        # Another tab refreshing with the same token just lost the race; while the family is
+        # still alive it gets its own successor instead of tripping reuse detection
+        grace_start = (now - timedelta(seconds=REFRESH_REUSE_GRACE_SECONDS)).isoformat()
+        family_alive = await db.sessions.find_one({"family_id": reused["family_id"], "revoked": False}, {"_id": 1})
+        if reused.get("rotated_at", "") >= grace_start and family_alive:
+            session = reused
+        else:
+            # A rotated token being replayed means it leaked; end the whole session family
+            await db.sessions.update_many({"family_id": reused["family_id"]}, {"$set": {"revoked": True}})
+            raise HTTPException(status_code=401, detail="Geçersiz oturum")
+    
+    expires_at = session["expires_at"]
+    if expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    if expires_at <= now:
+        raise HTTPException(status_code=401, detail="Oturum süresi dolmuş")
+    
+    user = await load_principal(session["user_id"])
+    if not user:
+        raise HTTPException(status_code=401, detail="Kullanıcı bulunamadı")
+    
+    return RefreshResponse(
+        access_token=create_token(user, user["permissions"]),
+        refresh_token=await create_session(user, session["family_id"])
+    )
+
+@api_router.post("/auth/logout")
+async def logout(data: RefreshRequest):
+    session = await db.sessions.find_one({"token_hash": hash_refresh_token(data.refresh_token)}, {"family_id": 1, "_id": 0})
+    if session:
+        await db.sessions.update_many({"family_id": session["family_id"]}, {"$set": {"revoked": True}})
+    return {"message": "Oturum kapatıldı"}
+
 @api_router.get("/auth/me", response_model=UserResponse)
 async def get_me(user: dict = Depends(get_current_user)):
     tenant_doc = await db.tenants.find_one({"id": user["tenant_id"]}, {"setup_completed": 1, "_id": 0})
@@ -739,16 +1562,84 @@ async def get_tenant(user: dict = Depends(get_current_user)):
 async def update_tenant(data: TenantUpdate, user: dict = Depends(get_current_user)):
     check_permission(user, "settings.manage")
     
+    if data.task_fallback_policy is not None and data.task_fallback_policy not in TASK_FALLBACK_POLICIES:
+        raise HTTPException(status_code=400, detail="Geçersiz görev oluşturma politikası")
+    
     update_data = {k: v for k, v in data.model_dump().items() if v is not None}
     if update_data:
         await db.tenants.update_one(
             {"id": user["tenant_id"]},
             {"$set": update_data}
         )
+        invalidate_tenant_catalog(user["tenant_id"])
     
     tenant = await db.tenants.find_one({"id": user["tenant_id"]}, {"_id": 0})
     return TenantResponse(**tenant)
 
+# ==================== TENANT TEMPLATE ROUTES ====================
+
+@api_router.get("/tenant-templates", response_model=List[TenantTemplateResponse])
+async def get_tenant_templates(user: dict = Depends(get_current_user)):
+    templates = await db.tenant_templates.find(
+        {"created_by_tenant_id": user["tenant_id"]}, {"_id": 0}
+    ).sort("key", 1).to_list(200)
+    return [TenantTemplateResponse(**t) for t in BUILTIN_TENANT_TEMPLATES.values()] + \
+        [TenantTemplateResponse(**t) for t in templates]
+
+@api_router.post("/tenant-templates", response_model=TenantTemplateResponse)
+async def create_tenant_template(data: TenantTemplateCreate, user: dict = Depends(get_current_user)):
+    require_admin(user)
+    
+    if data.key in BUILTIN_TENANT_TEMPLATES:
+        raise HTTPException(status_code=400, detail="Bu şablon anahtarı kullanılamaz")
+    
+    existing = await db.tenant_templates.find_one({"key": data.key, "created_by_tenant_id": user["tenant_id"]})
+    if existing:
+        raise HTTPException(status_code=400, detail="Bu şablon anahtarı zaten kayıtlı")
+    
+    template = {
+        **data.model_dump(),
+        "builtin": False,
+        "created_by_tenant_id": user["tenant_id"],
+        "created_at": datetime.now(timezone.utc).isoformat()
+    }
+    await db.tenant_templates.insert_one(template)
+    return TenantTemplateResponse(**template)
+
+@api_router.post("/tenant-templates/{key}/apply")
+async def apply_tenant_template(key: str, user: dict = Depends(get_current_user)):
+    require_admin(user)
+    
+    template = await get_tenant_template(key, user["tenant_id"])
+    
+    # Applying adds to the existing catalog; groups and work items already present by name are kept as is
+    existing_groups, existing_workitems = await asyncio.gather(
+        db.groups.find({"tenant_id": user["tenant_id"]}, {"name": 1, "_id": 0}).to_list(None),
+        db.workitems.find({"tenant_id": user["tenant_id"]}, {"name": 1, "_id": 0}).to_list(None)
+    )
+    catalog = build_template_catalog(template, user["tenant_id"], {
+        "groups": {g["name"] for g in existing_groups},
+        "workitems": {w["name"] for w in existing_workitems}
+    })
+    await insert_documents_atomically(catalog)
+    invalidate_tenant_catalog(user["tenant_id"])
+    
+    return {
+        "message": "Şablon uygulandı",
+        "groups": len(catalog["groups"]),
+        "subtasks": len(catalog["subtasks"]),
+        "workitems": len(catalog["workitems"])
+    }
+
+@api_router.delete("/tenant-templates/{key}")
+async def delete_tenant_template(key: str, user: dict = Depends(get_current_user)):
+    require_admin(user)
+    
+    result = await db.tenant_templates.delete_one({"key": key, "created_by_tenant_id": user["tenant_id"]})
+    if result.deleted_count == 0:
+        raise HTTPException(status_code=404, detail="Şablon bulunamadı")
+    return {"message": "Şablon silindi"}
+
 # ==================== ROLE ROUTES ====================
 
 @api_router.get("/roles", response_model=List[RoleResponse])
@@ -782,6 +1673,8 @@ async def update_role(role_id: str, data: RoleUpdate, user: dict = Depends(get_c
             {"$set": update_data}
         )
     
+    invalidate_role_principals(role_id)
+    
     role = await db.roles.find_one({"id": role_id, "tenant_id": user["tenant_id"]}, {"_id": 0})
     if not role:
         raise HTTPException(status_code=404, detail="Rol bulunamadı")
@@ -794,6 +1687,8 @@ async def delete_role(role_id: str, user: dict = Depends(get_current_user)):
     result = await db.roles.delete_one({"id": role_id, "tenant_id": user["tenant_id"]})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Rol bulunamadı")
+    
+    invalidate_role_principals(role_id)
     return {"message": "Rol silindi"}
 
 @api_router.get("/permissions")
@@ -821,6 +1716,7 @@ async def create_group(data: GroupCreate, user: dict = Depends(get_current_user)
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     await db.groups.insert_one(group)
+    invalidate_tenant_catalog(user["tenant_id"])
     return GroupResponse(**group)
 
 @api_router.put("/groups/{group_id}", response_model=GroupResponse)
@@ -834,6 +1730,8 @@ async def update_group(group_id: str, data: GroupUpdate, user: dict = Depends(ge
             {"$set": update_data}
         )
     
+    invalidate_tenant_catalog(user["tenant_id"])
+    
     group = await db.groups.find_one({"id": group_id, "tenant_id": user["tenant_id"]}, {"_id": 0})
     if not group:
         raise HTTPException(status_code=404, detail="Grup bulunamadı")
@@ -846,6 +1744,7 @@ async def delete_group(group_id: str, user: dict = Depends(get_current_user)):
     await db.subtasks.delete_many({"group_id": group_id, "tenant_id": user["tenant_id"]})
     
     result = await db.groups.delete_one({"id": group_id, "tenant_id": user["tenant_id"]})
+    invalidate_tenant_catalog(user["tenant_id"])
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Grup bulunamadı")
     return {"message": "Grup silindi"}
@@ -879,6 +1778,7 @@ async def create_subtask(data: SubTaskCreate, user: dict = Depends(get_current_u
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     await db.subtasks.insert_one(subtask)
+    invalidate_tenant_catalog(user["tenant_id"])
     return SubTaskResponse(**subtask)
 
 @api_router.put("/subtasks/{subtask_id}", response_model=SubTaskResponse)
@@ -892,6 +1792,8 @@ async def update_subtask(subtask_id: str, data: SubTaskUpdate, user: dict = Depe
             {"$set": update_data}
         )
     
+    invalidate_tenant_catalog(user["tenant_id"])
+    
     subtask = await db.subtasks.find_one({"id": subtask_id, "tenant_id": user["tenant_id"]}, {"_id": 0})
     if not subtask:
         raise HTTPException(status_code=404, detail="Alt görev bulunamadı")
@@ -902,6 +1804,7 @@ async def delete_subtask(subtask_id: str, user: dict = Depends(get_current_user)
     check_permission(user, "setup.subtasks")
     
     result = await db.subtasks.delete_one({"id": subtask_id, "tenant_id": user["tenant_id"]})
+    invalidate_tenant_catalog(user["tenant_id"])
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Alt görev bulunamadı")
     return {"message": "Alt görev silindi"}
@@ -926,6 +1829,7 @@ async def create_workitem(data: WorkItemCreate, user: dict = Depends(get_current
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     await db.workitems.insert_one(workitem)
+    invalidate_tenant_catalog(user["tenant_id"])
     return WorkItemResponse(**workitem)
 
 @api_router.put("/workitems/{workitem_id}", response_model=WorkItemResponse)
@@ -939,6 +1843,8 @@ async def update_workitem(workitem_id: str, data: WorkItemUpdate, user: dict = D
             {"$set": update_data}
         )
     
+    invalidate_tenant_catalog(user["tenant_id"])
+    
     workitem = await db.workitems.find_one({"id": workitem_id, "tenant_id": user["tenant_id"]}, {"_id": 0})
     if not workitem:
         raise HTTPException(status_code=404, detail="İş kalemi bulunamadı")
@@ -949,15 +1855,835 @@ async def delete_workitem(workitem_id: str, user: dict = Depends(get_current_use
     check_permission(user, "setup.workitems")
     
     result = await db.workitems.delete_one({"id": workitem_id, "tenant_id": user["tenant_id"]})
+    invalidate_tenant_catalog(user["tenant_id"])
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="İş kalemi bulunamadı")
     return {"message": "İş kalemi silindi"}
 
+# ==================== USER DIRECTORY ====================
+
+async def load_user_directory(tenant_id: str) -> dict:
+    directory = user_directory_cache.get(tenant_id)
+    if directory is not None:
+        return directory
+    
+    version = directory_versions.get(tenant_id)
+    users = await db.users.find(
+        {"tenant_id": tenant_id}, {"id": 1, "full_name": 1, "color": 1, "_id": 0}
+    ).to_list(None)
+    directory = {
+        "users": {u["id"]: {"full_name": u.get("full_name"), "color": u.get("color", "#4a4036")} for u in users},
+        "loaded_at": time.monotonic()
+    }
+    
+    if directory_versions.get(tenant_id) == version:
+        user_directory_cache.set(tenant_id, directory)
+    return directory
+
+async def resolve_users(tenant_id: str, user_ids) -> Dict[str, dict]:
+    directory = await load_user_directory(tenant_id)
+    wanted = {user_id for user_id in user_ids if user_id}
+    if any(user_id not in directory["users"] for user_id in wanted) \
+            and time.monotonic() - directory["loaded_at"] > USER_DIRECTORY_RELOAD_SECONDS:
+        invalidate_user_directory(tenant_id)
+        directory = await load_user_directory(tenant_id)
+    return directory["users"]
+
+# ==================== PROJECT ROLLUPS ====================
+
+# Counters kept on project and area documents so reads never scan tasks or payments
+PROJECT_ROLLUP_DEFAULTS = {
+    "task_count": 0,
+    "completed_task_count": 0,
+    "area_count": 0,
+    "total_agreed": 0,
+    "total_collected": 0
+}
+AREA_ROLLUP_DEFAULTS = {
+    "task_count": 0,
+    "completed_task_count": 0,
+    "collected_amount": 0
+}
+# Increments only apply once a document has been initialised or repaired
+ROLLUPS_READY = {"task_count": {"$exists": True}}
+
+def has_rollups(doc: dict) -> bool:
+    return "task_count" in doc
+
+async def inc_project_rollups(project_id: str, **deltas):
+    await db.projects.update_one({"id": project_id, **ROLLUPS_READY}, {"$inc": deltas})
+
+async def inc_area_rollups(area_id: str, **deltas):
+    await db.project_areas.update_one({"id": area_id, **ROLLUPS_READY}, {"$inc": deltas})
+
+# Per-area task status histogram, kept with $inc on every status transition
+STATUS_COUNTS_READY = {"status_counts": {"$exists": True}}
+
+def area_status_from_counts(counts: dict) -> str:
+    total = sum(counts.values())
+    if total and counts.get("tamamlandi", 0) == total:
+        return "tamamlandi"
+    if counts.get("montaj", 0) > 0:
+        return "montaj"
+    if counts.get("uretimde", 0) > 0:
+        return "uretimde"
+    return "planlandi"
+
+async def update_area_status(area_id: str, status_deltas: Dict[str, int]):
+    area = await db.project_areas.find_one_and_update(
+        {"id": area_id, **STATUS_COUNTS_READY},
+        {"$inc": {f"status_counts.{task_status}": delta for task_status, delta in status_deltas.items()}},
+        projection={"status_counts": 1, "_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    if area:
+        new_area_status = area_status_from_counts(area["status_counts"])
+    else:
+        # Areas without a histogram yet are scanned until repair-rollups builds one
+        statuses = await task_repository.area_statuses(area_id)
+        new_area_status = area_status_from_counts({s: statuses.count(s) for s in set(statuses)})
+    
+    await db.project_areas.update_one(
+        {"id": area_id},
+        {"$set": {"status": new_area_status, "updated_at": datetime.now(timezone.utc).isoformat()}}
+    )
+
+async def compute_rollups(project_ids: List[str]):
+    task_counts, payment_sums, areas = await asyncio.gather(
+        task_repository.status_counts(project_ids),
+        db.project_payments.aggregate([
+            {"$match": {"project_id": {"$in": project_ids}}},
+            {"$group": {"_id": "$area_id", "collected": {"$sum": "$amount"}}}
+        ]).to_list(None),
+        db.project_areas.find(
+            {"project_id": {"$in": project_ids}},
+            {"id": 1, "project_id": 1, "agreed_price": 1, "task_materialization": 1, "work_items": 1, "_id": 0}
+        ).to_list(None)
+    )
+    
+    project_rollups = {pid: dict(PROJECT_ROLLUP_DEFAULTS) for pid in project_ids}
+    area_rollups = {a["id"]: {**AREA_ROLLUP_DEFAULTS, "status_counts": {}} for a in areas}
+    lazy_area_ids = {a["id"] for a in areas if is_lazy_area(a)}
+    stored_counts = {}
+    
+    for row in task_counts:
+        area_id = row["_id"].get("area_id")
+        task_status = row["_id"]["status"]
+        completed = row["count"] if task_status == "tamamlandi" else 0
+        stored_counts[area_id] = stored_counts.get(area_id, 0) + row["count"]
+        # A lazy area's task count comes from its plan, stored rows only add progress
+        total = 0 if area_id in lazy_area_ids else row["count"]
+        
+        project_rollup = project_rollups.get(row["_id"]["project_id"])
+        if project_rollup is not None:
+            project_rollup["task_count"] += total
+            project_rollup["completed_task_count"] += completed
+        area_rollup = area_rollups.get(area_id)
+        if area_rollup is not None:
+            area_rollup["task_count"] += total
+            area_rollup["completed_task_count"] += completed
+            area_rollup["status_counts"][task_status] = area_rollup["status_counts"].get(task_status, 0) + row["count"]
+    
+    for row in payment_sums:
+        if row["_id"] in area_rollups:
+            area_rollups[row["_id"]]["collected_amount"] = row["collected"]
+    
+    for area in areas:
+        project_rollup = project_rollups[area["project_id"]]
+        if area["id"] in lazy_area_ids:
+            planned = planned_task_count(area)
+            area_rollups[area["id"]]["task_count"] += planned
+            project_rollup["task_count"] += planned
+            virtual = planned - stored_counts.get(area["id"], 0)
+            if virtual > 0:
+                counts = area_rollups[area["id"]]["status_counts"]
+                counts["bekliyor"] = counts.get("bekliyor", 0) + virtual
+        project_rollup["area_count"] += 1
+        project_rollup["total_agreed"] += area.get("agreed_price", 0)
+        project_rollup["total_collected"] += area_rollups[area["id"]]["collected_amount"]
+    
+    return project_rollups, area_rollups
+
+async def repair_rollups(project_ids: List[str]):
+    project_rollups, area_rollups = await compute_rollups(project_ids)
+    
+    if area_rollups:
+        await db.project_areas.bulk_write([
+            UpdateOne({"id": area_id}, {"$set": rollup})
+            for area_id, rollup in area_rollups.items()
+        ], ordered=False)
+    if project_rollups:
+        await db.projects.bulk_write([
+            UpdateOne({"id": project_id}, {"$set": rollup})
+            for project_id, rollup in project_rollups.items()
+        ], ordered=False)
+
+# ==================== TENANT CATALOG ====================
+
+async def load_tenant_catalog(tenant_id: str) -> dict:
+    catalog = catalog_cache.get(tenant_id)
+    if catalog is not None:
+        return catalog
+    
+    version = catalog_versions.get(tenant_id)
+    # Read in full: a truncated catalog would silently drop planned subtasks
+    subtasks, groups, workitems, tenant = await asyncio.gather(
+        db.subtasks.find({"tenant_id": tenant_id}, {"_id": 0}).sort("order", 1).to_list(None),
+        db.groups.find({"tenant_id": tenant_id}, {"_id": 0}).to_list(None),
+        db.workitems.find({"tenant_id": tenant_id}, {"_id": 0}).to_list(None),
+        db.tenants.find_one({"id": tenant_id}, {"task_fallback_policy": 1, "_id": 0})
+    )
+    catalog = {
+        "subtasks": subtasks,
+        "groups": {g["id"]: g for g in groups},
+        "workitems": {w["id"]: w for w in workitems},
+        "task_fallback_policy": (tenant or {}).get("task_fallback_policy", "all")
+    }
+    
+    # Skip caching if a setup route changed the catalog while we were reading it
+    if catalog_versions.get(tenant_id) == version:
+        catalog_cache.set(tenant_id, catalog)
+    return catalog
+
+# "all": work items without configured subtasks get every tenant subtask (legacy behaviour)
+# "none": such work items generate no tasks
+TASK_FALLBACK_POLICIES = ("all", "none")
+
+def plan_workitem_subtasks(catalog: dict, workitem_def: Optional[dict]) -> List[dict]:
+    configured = set((workitem_def or {}).get("default_subtask_ids") or [])
+    planned = [st for st in catalog["subtasks"] if st["id"] in configured]
+    if planned:
+        return planned
+    if catalog["task_fallback_policy"] == "none":
+        return []
+    return catalog["subtasks"]
+
+async def prune_unplanned_tasks(tenant_id: str, dry_run: bool = False) -> int:
+    catalog = await load_tenant_catalog(tenant_id)
+    pruned = 0
+    affected_projects = set()
+    
+    areas = db.project_areas.find(
+        {"tenant_id": tenant_id},
+        {"id": 1, "project_id": 1, "work_items": 1, "task_materialization": 1, "task_storage": 1, "_id": 0}
+    )
+    async for area in areas:
+        planned = set()
+        for wi in area.get("work_items", []):
+            for st in plan_workitem_subtasks(catalog, catalog["workitems"].get(wi["work_item_id"])):
+                planned.add((wi["work_item_id"], st["id"]))
+        
+        if area_storage(area) == "packed":
+            packed_pruned = await prune_task_pack(area["id"], planned, dry_run)
+            if packed_pruned:
+                pruned += packed_pruned
+                affected_projects.add(area["project_id"])
+            continue
+        
+        # Only untouched tasks are candidates; anything with progress, notes or an assignee stays
+        candidates = await db.project_tasks.find(
+            {"area_id": area["id"], "status": "bekliyor", "notes": None, "assigned_to": None},
+            {"id": 1, "work_item_id": 1, "subtask_id": 1, "_id": 0}
+        ).to_list(None)
+        unplanned = [t["id"] for t in candidates if (t["work_item_id"], t["subtask_id"]) not in planned]
+        if unplanned:
+            with_files = set(await db.files.distinct("task_id", {"task_id": {"$in": unplanned}}))
+            unplanned = [task_id for task_id in unplanned if task_id not in with_files]
+        
+        trimmed_work_items = None
+        virtual_pruned = 0
+        if is_lazy_area(area):
+            # Drop unplanned virtual tasks from the area's plan; stored ones that
+            # survived the checks above keep their entry
+            stored_ids = set(await db.project_tasks.distinct("id", {"area_id": area["id"]})) - set(unplanned)
+            trimmed_work_items = []
+            for index, wi in enumerate(area.get("work_items", [])):
+                kept = [
+                    sid for sid in wi.get("subtask_ids", [])
+                    if (wi["work_item_id"], sid) in planned or planned_task_id(area["id"], index, sid) in stored_ids
+                ]
+                virtual_pruned += len(wi.get("subtask_ids", [])) - len(kept)
+                trimmed_work_items.append({**wi, "subtask_ids": kept})
+            virtual_pruned -= len(unplanned)
+        if not unplanned and not virtual_pruned:
+            continue
+        
+        pruned += len(unplanned) + virtual_pruned
+        affected_projects.add(area["project_id"])
+        if not dry_run:
+            if unplanned:
+                await db.project_tasks.delete_many({"id": {"$in": unplanned}})
+            if trimmed_work_items is not None:
+                await db.project_areas.update_one({"id": area["id"]}, {"$set": {"work_items": trimmed_work_items}})
+    
+    if affected_projects and not dry_run:
+        await repair_rollups(list(affected_projects))
+        for project_id in affected_projects:
+            touch_project(project_id)
+    
+    return pruned
+
+async def prune_task_pack(area_id: str, planned: set, dry_run: bool) -> int:
+    pack = await db.area_task_packs.find_one({"area_id": area_id}, {"_id": 0})
+    if not pack:
+        return 0
+    
+    candidates = [
+        task["id"] for task in unpack_tasks(pack)
+        if task["status"] == "bekliyor" and task["notes"] is None and task["assigned_to"] is None
+        and (task["work_item_id"], task["subtask_id"]) not in planned
+    ]
+    if candidates:
+        with_files = set(await db.files.distinct("task_id", {"task_id": {"$in": candidates}}))
+        candidates = [task_id for task_id in candidates if task_id not in with_files]
+    if not candidates or dry_run:
+        return len(candidates)
+    
+    removed = set(candidates)
+    keep = [i for i, task_id in enumerate(pack["ids"]) if task_id not in removed]
+    changes = {
+        field: [pack[field][i] for i in keep]
+        for field in ("ids", "task_work_items", "subtask_ids", "statuses")
+    }
+    # Rewrite the arrays only if nobody touched the pack since it was read
+    result = await db.area_task_packs.update_one(
+        {"area_id": area_id, "ids": pack["ids"], "statuses": pack["statuses"]},
+        {"$set": changes, "$unset": {f"overrides.{task_id}": "" for task_id in removed}}
+    )
+    return len(candidates) if result.modified_count else 0
+
+async def resolve_workitems(tenant_id: str, workitem_ids: List[str]) -> dict:
+    catalog = await load_tenant_catalog(tenant_id)
+    if any(wi_id not in catalog["workitems"] for wi_id in workitem_ids):
+        # The snapshot may predate a work item created through another worker
+        invalidate_tenant_catalog(tenant_id)
+        catalog = await load_tenant_catalog(tenant_id)
+    return catalog
+
+# ==================== PLANNED TASKS ====================
+
+def planned_task_id(area_id: str, work_item_index: int, subtask_id: str) -> str:
+    # Deterministic, so a virtual task keeps its id once it is persisted
+    return str(uuid.uuid5(uuid.UUID(area_id), f"{work_item_index}:{subtask_id}"))
+
+def planned_task_count(area: dict) -> int:
+    return sum(len(wi.get("subtask_ids", [])) for wi in area.get("work_items", []))
+
+def is_lazy_area(area: dict) -> bool:
+    return area.get("task_materialization") == "lazy"
+
+def expand_area_tasks(area: dict, catalog: dict) -> List[dict]:
+    subtasks = {st["id"]: st for st in catalog["subtasks"]}
+    tasks = []
+    
+    for index, wi in enumerate(area.get("work_items", [])):
+        for subtask_id in wi.get("subtask_ids", []):
+            st_def = subtasks.get(subtask_id, {})
+            group_info = catalog["groups"].get(st_def.get("group_id"), {})
+            
+            tasks.append({
+                "id": planned_task_id(area["id"], index, subtask_id),
+                "project_id": area["project_id"],
+                "area_id": area["id"],
+                "tenant_id": area["tenant_id"],
+                "work_item_id": wi["work_item_id"],
+                "work_item_name": wi["work_item_name"],
+                "group_id": st_def.get("group_id", ""),
+                "group_name": group_info.get("name", ""),
+                "subtask_id": subtask_id,
+                "subtask_name": st_def.get("name", "Silinmiş Alt Görev"),
+                "status": "bekliyor",
+                "notes": None,
+                "assigned_to": None,
+                "created_at": area["created_at"],
+                "updated_at": area["created_at"]
+            })
+    
+    return tasks
+
+# ==================== TASK STORAGE ====================
+
+# Packed statuses are stored as small integers; unknown values are kept verbatim
+TASK_STATUS_CODES = ("bekliyor", "uretimde", "montaj", "kontrol", "tamamlandi")
+TASK_STORAGE_ENGINES = ("documents", "packed")
+
+def encode_task_status(value: str):
+    return TASK_STATUS_CODES.index(value) if value in TASK_STATUS_CODES else value
+
+def decode_task_status(value) -> str:
+    return TASK_STATUS_CODES[value] if isinstance(value, int) else value
+
+def area_storage(area: dict) -> str:
+    return area.get("task_storage", "documents")
+
+def build_task_pack(area: dict, tasks: List[dict]) -> dict:
+    work_items, work_item_index, subtasks = [], {}, {}
+    pack = {
+        "area_id": area["id"],
+        "project_id": area["project_id"],
+        "tenant_id": area["tenant_id"],
+        "work_items": work_items,
+        "subtasks": subtasks,
+        "ids": [],
+        "task_work_items": [],
+        "subtask_ids": [],
+        "statuses": [],
+        "overrides": {},
+        "created_at": area["created_at"],
+        "updated_at": area["created_at"]
+    }
+    
+    for task in tasks:
+        if task["work_item_id"] not in work_item_index:
+            work_item_index[task["work_item_id"]] = len(work_items)
+            work_items.append([task["work_item_id"], task["work_item_name"]])
+        subtasks.setdefault(task["subtask_id"], [task["subtask_name"], task["group_id"], task["group_name"]])
+        
+        pack["ids"].append(task["id"])
+        pack["task_work_items"].append(work_item_index[task["work_item_id"]])
+        pack["subtask_ids"].append(task["subtask_id"])
+        pack["statuses"].append(encode_task_status(task.get("status", "bekliyor")))
+        
+        # Only tasks that were touched carry an override entry
+        override = {k: task[k] for k in ("notes", "assigned_to") if task.get(k) is not None}
+        if override or task.get("updated_at", area["created_at"]) != area["created_at"]:
+            pack["overrides"][task["id"]] = {**override, "updated_at": task.get("updated_at")}
+    
+    return pack
+
+def unpack_tasks(pack: dict) -> List[dict]:
+    tasks = []
+    for i, task_id in enumerate(pack["ids"]):
+        work_item_id, work_item_name = pack["work_items"][pack["task_work_items"][i]]
+        subtask_name, group_id, group_name = pack["subtasks"][pack["subtask_ids"][i]]
+        override = pack["overrides"].get(task_id, {})
+        tasks.append({
+            "id": task_id,
+            "project_id": pack["project_id"],
+            "area_id": pack["area_id"],
+            "tenant_id": pack["tenant_id"],
+            "work_item_id": work_item_id,
+            "work_item_name": work_item_name,
+            "group_id": group_id,
+            "group_name": group_name,
+            "subtask_id": pack["subtask_ids"][i],
+            "subtask_name": subtask_name,
+            "status": decode_task_status(pack["statuses"][i]),
+            "notes": override.get("notes"),
+            "assigned_to": override.get("assigned_to"),
+            "created_at": pack["created_at"],
+            "updated_at": override.get("updated_at") or pack["created_at"]
+        })
+    return tasks
+
+TASK_SUMMARY_KEYS = ("area_id", "group_id", "group_name", "status")
+
+def add_to_task_summary(buckets: dict, task: dict, with_ids: bool):
+    key = tuple(task.get(k) for k in TASK_SUMMARY_KEYS)
+    bucket = buckets.setdefault(key, {**dict(zip(TASK_SUMMARY_KEYS, key)), "count": 0})
+    bucket["count"] += 1
+    if with_ids:
+        bucket.setdefault("task_ids", []).append(task["id"])
+
+class DocumentTaskStore:
+    # One project_tasks document per task; lazy areas only store touched tasks
+    name = "documents"
+    collection = "project_tasks"
+    
+    async def list(self, project_id: str, tenant_id: str, areas: List[dict], area_id: Optional[str] = None) -> List[dict]:
+        query = {"project_id": project_id}
+        if area_id:
+            query["area_id"] = area_id
+        stored = await db.project_tasks.find(query, {"_id": 0}).to_list(None)
+        
+        lazy_areas = [a for a in areas if is_lazy_area(a)]
+        if not lazy_areas:
+            return stored
+        
+        catalog = await load_tenant_catalog(tenant_id)
+        lazy_area_ids = {a["id"] for a in lazy_areas}
+        stored_by_id = {t["id"]: t for t in stored if t.get("area_id") in lazy_area_ids}
+        
+        tasks = [t for t in stored if t.get("area_id") not in lazy_area_ids]
+        for area in lazy_areas:
+            for planned in expand_area_tasks(area, catalog):
+                tasks.append(stored_by_id.pop(planned["id"], planned))
+        tasks += stored_by_id.values()
+        return tasks
+    
+    async def get_many(self, project_id: str, task_ids: List[str], tenant_id: str) -> Dict[str, dict]:
+        stored = await db.project_tasks.find(
+            {"id": {"$in": task_ids}, "project_id": project_id}, {"_id": 0}
+        ).to_list(None)
+        tasks = {t["id"]: t for t in stored}
+        missing = set(task_ids) - set(tasks)
+        if not missing:
+            return tasks
+        
+        lazy_areas = await db.project_areas.find(
+            {"project_id": project_id, "task_materialization": "lazy"}, {"_id": 0}
+        ).to_list(None)
+        if not lazy_areas:
+            return tasks
+        
+        catalog = await load_tenant_catalog(tenant_id)
+        planned = [t for area in lazy_areas for t in expand_area_tasks(area, catalog) if t["id"] in missing]
+        if planned:
+            # First touch persists the virtual task; concurrent callers converge on one row
+            await db.project_tasks.bulk_write([
+                UpdateOne({"id": t["id"]}, {"$setOnInsert": t}, upsert=True) for t in planned
+            ], ordered=False)
+            materialized = await db.project_tasks.find(
+                {"id": {"$in": [t["id"] for t in planned]}}, {"_id": 0}
+            ).to_list(None)
+            tasks.update({t["id"]: t for t in materialized})
+        return tasks
+    
+    async def update_ops(self, changes: List[tuple]) -> list:
+        ops = []
+        for task, update_fields, expected_status in changes:
+            task_filter = {"id": task["id"]}
+            if expected_status is not None:
+                task_filter["status"] = expected_status
+            ops.append(UpdateOne(task_filter, {"$set": update_fields}))
+        return ops
+    
+    async def stream(self, project_id: str, tenant_id: str, areas: List[dict], filters: dict, area_id: Optional[str] = None):
+        query = {"project_id": project_id, **filters}
+        if area_id:
+            query["area_id"] = area_id
+        async for task in db.project_tasks.find(query, {"_id": 0}).batch_size(TASK_EXPORT_BATCH_SIZE):
+            yield task
+        
+        lazy_areas = [a for a in areas if is_lazy_area(a)]
+        if not lazy_areas:
+            return
+        catalog = await load_tenant_catalog(tenant_id)
+        for area in lazy_areas:
+            stored_ids = set(await db.project_tasks.distinct("id", {"area_id": area["id"]}))
+            for planned in expand_area_tasks(area, catalog):
+                if planned["id"] not in stored_ids and all(planned.get(k) == v for k, v in filters.items()):
+                    yield planned
+    
+    async def summary(self, project_id: str, tenant_id: str, areas: List[dict], filters: dict, buckets: dict, with_ids: bool):
+        group_stage = {
+            "_id": {k: f"${k}" for k in TASK_SUMMARY_KEYS},
+            "count": {"$sum": 1}
+        }
+        if with_ids:
+            group_stage["task_ids"] = {"$push": "$id"}
+        rows = await db.project_tasks.aggregate([
+            {"$match": {"project_id": project_id, **filters}},
+            {"$group": group_stage}
+        ]).to_list(None)
+        for row in rows:
+            key = tuple(row["_id"].get(k) for k in TASK_SUMMARY_KEYS)
+            buckets[key] = {**dict(zip(TASK_SUMMARY_KEYS, key)), "count": row["count"]}
+            if with_ids:
+                buckets[key]["task_ids"] = row["task_ids"]
+        
+        lazy_areas = [a for a in areas if is_lazy_area(a)]
+        if not lazy_areas:
+            return
+        catalog = await load_tenant_catalog(tenant_id)
+        stored_ids = set(await db.project_tasks.distinct("id", {"area_id": {"$in": [a["id"] for a in lazy_areas]}}))
+        for area in lazy_areas:
+            for planned in expand_area_tasks(area, catalog):
+                if planned["id"] not in stored_ids and all(planned.get(k) == v for k, v in filters.items()):
+                    add_to_task_summary(buckets, planned, with_ids)
+    
+    async def area_statuses(self, area: dict) -> List[str]:
+        area_tasks = await db.project_tasks.find({"area_id": area["id"]}, {"status": 1, "_id": 0}).to_list(None)
+        statuses = [t.get("status", "bekliyor") for t in area_tasks]
+        if is_lazy_area(area):
+            # Unstored tasks of a lazy area are still waiting
+            statuses += ["bekliyor"] * max(area.get("task_count", 0) - len(statuses), 0)
+        return statuses
+    
+    def rows(self, area: dict, tasks: List[dict]) -> Dict[str, List[dict]]:
+        return {"project_tasks": tasks} if tasks and not is_lazy_area(area) else {}
+    
+    async def status_counts(self, project_ids: List[str]) -> List[dict]:
+        return await db.project_tasks.aggregate([
+            {"$match": {"project_id": {"$in": project_ids}}},
+            {"$group": {
+                "_id": {"project_id": "$project_id", "area_id": "$area_id", "status": {"$ifNull": ["$status", "bekliyor"]}},
+                "count": {"$sum": 1}
+            }}
+        ]).to_list(None)
+
+class PackedTaskStore:
+    # One area_task_packs document per area: parallel arrays plus sparse overrides
+    name = "packed"
+    collection = "area_task_packs"
+    
+    async def list(self, project_id: str, tenant_id: str, areas: List[dict], area_id: Optional[str] = None) -> List[dict]:
+        if not areas:
+            return []
+        packs = await db.area_task_packs.find(
+            {"area_id": {"$in": [a["id"] for a in areas]}}, {"_id": 0}
+        ).to_list(None)
+        packs_by_area = {p["area_id"]: p for p in packs}
+        return [task for a in areas if a["id"] in packs_by_area for task in unpack_tasks(packs_by_area[a["id"]])]
+    
+    async def get_many(self, project_id: str, task_ids: List[str], tenant_id: str) -> Dict[str, dict]:
+        wanted = set(task_ids)
+        packs = await db.area_task_packs.find(
+            {"project_id": project_id, "ids": {"$in": task_ids}}, {"_id": 0}
+        ).to_list(None)
+        return {t["id"]: t for pack in packs for t in unpack_tasks(pack) if t["id"] in wanted}
+    
+    async def update_ops(self, changes: List[tuple]) -> list:
+        area_ids = list({task["area_id"] for task, _, _ in changes})
+        packs = await db.area_task_packs.find({"area_id": {"$in": area_ids}}, {"area_id": 1, "ids": 1, "_id": 0}).to_list(None)
+        positions = {task_id: i for pack in packs for i, task_id in enumerate(pack["ids"])}
+        
+        ops = []
+        for task, update_fields, expected_status in changes:
+            i = positions.get(task["id"])
+            if i is None:
+                continue
+            # Each op guards its own slot, so one conflict does not fail the whole pack
+            pack_filter = {"area_id": task["area_id"], f"ids.{i}": task["id"]}
+            if expected_status is not None:
+                pack_filter[f"statuses.{i}"] = encode_task_status(expected_status)
+            
+            pack_changes = {"updated_at": update_fields["updated_at"]}
+            for field, value in update_fields.items():
+                if field == "status":
+                    pack_changes[f"statuses.{i}"] = encode_task_status(value)
+                else:
+                    pack_changes[f"overrides.{task['id']}.{field}"] = value
+            ops.append(UpdateOne(pack_filter, {"$set": pack_changes}))
+        return ops
+    
+    async def stream(self, project_id: str, tenant_id: str, areas: List[dict], filters: dict, area_id: Optional[str] = None):
+        if not areas:
+            return
+        query = {"area_id": {"$in": [a["id"] for a in areas]}}
+        if "status" in filters:
+            query["statuses"] = encode_task_status(filters["status"])
+        # Each pack holds a whole area, so fetch only a few at a time
+        async for pack in db.area_task_packs.find(query, {"_id": 0}).batch_size(max(1, TASK_EXPORT_BATCH_SIZE // 100)):
+            for task in unpack_tasks(pack):
+                if all(task.get(k) == v for k, v in filters.items()):
+                    yield task
+    
+    async def summary(self, project_id: str, tenant_id: str, areas: List[dict], filters: dict, buckets: dict, with_ids: bool):
+        if not areas:
+            return
+        # Packs are already compact per area; counting their arrays beats unwinding them server-side
+        query = {"area_id": {"$in": [a["id"] for a in areas]}}
+        if "status" in filters:
+            query["statuses"] = encode_task_status(filters["status"])
+        async for pack in db.area_task_packs.find(query, {"_id": 0}):
+            for task in unpack_tasks(pack):
+                if all(task.get(k) == v for k, v in filters.items()):
+                    add_to_task_summary(buckets, task, with_ids)
+    
+    async def area_statuses(self, area: dict) -> List[str]:
+        pack = await db.area_task_packs.find_one({"area_id": area["id"]}, {"statuses": 1, "_id": 0})
+        return [decode_task_status(s) for s in pack["statuses"]] if pack else []
+    
+    def rows(self, area: dict, tasks: List[dict]) -> Dict[str, List[dict]]:
+        return {"area_task_packs": [build_task_pack(area, tasks)]}
+    
+    async def status_counts(self, project_ids: List[str]) -> List[dict]:
+        rows = await db.area_task_packs.aggregate([
+            {"$match": {"project_id": {"$in": project_ids}}},
+            {"$unwind": "$statuses"},
+            {"$group": {
+                "_id": {"project_id": "$project_id", "area_id": "$area_id", "status": "$statuses"},
+                "count": {"$sum": 1}
+            }}
+        ]).to_list(None)
+        for row in rows:
+            row["_id"]["status"] = decode_task_status(row["_id"]["status"])
+        return rows
+
+class TaskRepository:
+    # Routes tasks to the storage engine recorded on their area
+    def __init__(self):
+        self.stores = {store.name: store for store in (DocumentTaskStore(), PackedTaskStore())}
+    
+    def store_for(self, area: dict):
+        return self.stores[area_storage(area)]
+    
+    async def _areas_by_storage(self, project_id: str, area_id: Optional[str] = None) -> Dict[str, List[dict]]:
+        area_query = {"project_id": project_id}
+        if area_id:
+            area_query["id"] = area_id
+        areas = await db.project_areas.find(area_query, {"_id": 0}).to_list(None)
+        
+        by_storage = {name: [] for name in self.stores}
+        for area in areas:
+            by_storage[area_storage(area)].append(area)
+        return by_storage
+    
+    async def list(self, project_id: str, tenant_id: str, area_id: Optional[str] = None) -> List[dict]:
+        by_storage = await self._areas_by_storage(project_id, area_id)
+        
+        # Document tasks are listed even without a matching area, as before
+        results = await asyncio.gather(*[
+            store.list(project_id, tenant_id, by_storage[name], area_id)
+            for name, store in self.stores.items()
+            if by_storage[name] or name == "documents"
+        ])
+        return [task for tasks in results for task in tasks]
+    
+    async def stream(self, project_id: str, tenant_id: str, filters: dict, area_id: Optional[str] = None):
+        by_storage = await self._areas_by_storage(project_id, area_id)
+        for name, store in self.stores.items():
+            if by_storage[name] or name == "documents":
+                async for task in store.stream(project_id, tenant_id, by_storage[name], filters, area_id):
+                    yield task
+    
+    async def summary(self, project_id: str, tenant_id: str, filters: dict, with_ids: bool = False) -> List[dict]:
+        by_storage = await self._areas_by_storage(project_id, filters.get("area_id"))
+        buckets = {}
+        for name, store in self.stores.items():
+            if by_storage[name] or name == "documents":
+                await store.summary(project_id, tenant_id, by_storage[name], filters, buckets, with_ids)
+        return list(buckets.values())
+    
+    async def get_many(self, project_id: str, task_ids: List[str], tenant_id: str) -> Dict[str, dict]:
+        tasks = {}
+        for store in self.stores.values():
+            remaining = [task_id for task_id in task_ids if task_id not in tasks]
+            if not remaining:
+                break
+            tasks.update(await store.get_many(project_id, remaining, tenant_id))
+        return tasks
+    
+    async def get(self, project_id: str, task_id: str, tenant_id: str) -> Optional[dict]:
+        return (await self.get_many(project_id, [task_id], tenant_id)).get(task_id)
+    
+    async def update_many(self, changes: List[tuple]) -> set:
+        # changes: (task, update_fields, expected_status); returns the ids that were applied
+        if not changes:
+            return set()
+        area_ids = list({task.get("area_id") for task, _, _ in changes})
+        areas = await db.project_areas.find({"id": {"$in": area_ids}}, {"id": 1, "task_storage": 1, "_id": 0}).to_list(None)
+        storage_by_area = {a["id"]: area_storage(a) for a in areas}
+        
+        applied = set()
+        for name, store in self.stores.items():
+            group = [c for c in changes if storage_by_area.get(c[0].get("area_id"), "documents") == name]
+            ops = await store.update_ops(group) if group else []
+            if not ops:
+                continue
+            
+            result = await db[store.collection].bulk_write(ops, ordered=False)
+            task_ids = [task["id"] for task, _, _ in group]
+            if result.matched_count == len(group):
+                applied.update(task_ids)
+                continue
+            
+            # Some guards failed: the rows carrying this batch's timestamp are the ones applied
+            task, update_fields, _ = group[0]
+            current = await store.get_many(task["project_id"], task_ids, task["tenant_id"])
+            applied.update(
+                task_id for task_id, t in current.items()
+                if t.get("updated_at") == update_fields["updated_at"]
+            )
+        return applied
+    
+    async def area_statuses(self, area_id: str) -> List[str]:
+        area = await db.project_areas.find_one(
+            {"id": area_id}, {"_id": 0, "id": 1, "task_storage": 1, "task_materialization": 1, "task_count": 1}
+        )
+        return await self.store_for(area).area_statuses(area) if area else []
+    
+    def rows(self, area: dict, tasks: List[dict]) -> Dict[str, List[dict]]:
+        return self.store_for(area).rows(area, tasks)
+    
+    async def insert(self, area: dict, tasks: List[dict]):
+        for collection, docs in self.rows(area, tasks).items():
+            await db[collection].insert_many(docs)
+    
+    async def status_counts(self, project_ids: List[str]) -> List[dict]:
+        results = await asyncio.gather(*[store.status_counts(project_ids) for store in self.stores.values()])
+        return [row for rows in results for row in rows]
+    
+    async def delete_area(self, area_id: str):
+        await asyncio.gather(
+            db.project_tasks.delete_many({"area_id": area_id}),
+            db.area_task_packs.delete_many({"area_id": area_id})
+        )
+    
+    async def delete_project(self, project_id: str):
+        await asyncio.gather(
+            db.project_tasks.delete_many({"project_id": project_id}),
+            db.area_task_packs.delete_many({"project_id": project_id})
+        )
+    
+    async def stored_task_count(self, area: dict) -> int:
+        if area_storage(area) == "packed":
+            pack = await db.area_task_packs.find_one({"area_id": area["id"]}, {"ids": 1, "_id": 0})
+            return len(pack["ids"]) if pack else 0
+        return await db.project_tasks.count_documents({"area_id": area["id"]})
+    
+    async def migrate_area(self, area: dict, target: str) -> int:
+        source = area_storage(area)
+        if source == target:
+            return 0
+        
+        # Read the source uncapped; lazy areas also yield their virtual tasks
+        source_count = await self.stored_task_count(area)
+        tasks = [
+            task async for task in self.stores[source].stream(
+                area["project_id"], area["tenant_id"], [area], {}, area["id"]
+            )
+        ]
+        
+        if target == "packed":
+            await db.area_task_packs.replace_one({"area_id": area["id"]}, build_task_pack(area, tasks), upsert=True)
+        else:
+            await db.project_tasks.delete_many({"area_id": area["id"]})
+            if tasks:
+                await db.project_tasks.insert_many(tasks)
+        
+        # Never drop the source unless the target holds every task it had
+        written = await self.stored_task_count({**area, "task_storage": target})
+        if written != len(tasks) or written < source_count:
+            if target == "packed":
+                await db.area_task_packs.delete_one({"area_id": area["id"]})
+            else:
+                await db.project_tasks.delete_many({"area_id": area["id"]})
+            raise RuntimeError(
+                f"Alan {area['id']} taşınamadı: kaynakta {source_count}, okunan {len(tasks)}, yazılan {written} görev"
+            )
+        
+        await db.project_areas.update_one(
+            {"id": area["id"]},
+            {"$set": {"task_storage": target, "task_materialization": "eager", "task_count": len(tasks)}}
+        )
+        if source == "packed":
+            await db.area_task_packs.delete_one({"area_id": area["id"]})
+        else:
+            await db.project_tasks.delete_many({"area_id": area["id"]})
+        return len(tasks)
+
+task_repository = TaskRepository()
+
 # ==================== PROJECT ROUTES ====================
 
 @api_router.get("/projects")
-async def get_projects(status: str = None, user: dict = Depends(get_current_user)):
+async def get_projects(
+    response: Response,
+    status: str = None,
+    cursor: str = None,
+    limit: int = PROJECTS_PAGE_SIZE,
+    customer: str = None,
+    search: str = None,
+    due_from: str = None,
+    due_to: str = None,
+    city: str = None,
+    district: str = None,
+    user: dict = Depends(get_current_user)
+):
     tenant_id = user["tenant_id"]
+    limit = clamp_page_size(limit)
     
     has_view_all = False
     if user.get("is_admin"):
@@ -991,21 +2717,53 @@ async def get_projects(status: str = None, user: dict = Depends(get_current_user
             {"created_by": user["id"]}
         ]
     
-    projects = await db.projects.find(query, {"_id": 0}).sort("created_at", -1).to_list(500)
+    conditions = []
+    if customer:
+        query["customer_name"] = {"$regex": re.escape(customer), "$options": "i"}
+    if search:
+        # The list's search box matches project or customer name across all pages, not just loaded ones
+        pattern = {"$regex": re.escape(search), "$options": "i"}
+        conditions.append({"$or": [{"name": pattern}, {"customer_name": pattern}]})
+    if due_from or due_to:
+        query["due_date"] = {}
+        if due_from:
+            query["due_date"]["$gte"] = due_from
+        if due_to:
+            query["due_date"]["$lte"] = due_to
+    if city or district:
+        area_query = {"tenant_id": tenant_id}
+        if city:
+            area_query["city"] = city
+        if district:
+            area_query["district"] = district
+        area_project_ids = await db.project_areas.distinct("project_id", area_query)
+        conditions.append({"id": {"$in": area_project_ids}})
+    if cursor:
+        last_created_at, last_id = decode_cursor(cursor, 2)
+        conditions.append(keyset_condition("created_at", last_created_at, last_id))
+    if conditions:
+        query["$and"] = conditions
+    
+    projects = await db.projects.find(query, {"_id": 0}).sort(
+        [("created_at", -1), ("id", -1)]
+    ).limit(limit + 1).to_list(limit + 1)
+    
+    if len(projects) > limit:
+        projects = projects[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(projects[-1]["created_at"], projects[-1]["id"])
+    
+    # Projects created before rollups existed are counted from source until repaired
+    legacy_ids = [p["id"] for p in projects if not has_rollups(p)]
+    legacy_rollups = (await compute_rollups(legacy_ids))[0] if legacy_ids else {}
     
     result = []
     for project in projects:
-        tasks = await db.project_tasks.find({"project_id": project["id"]}, {"status": 1, "_id": 0}).to_list(1000)
-        total_tasks = len(tasks)
-        completed_tasks = len([t for t in tasks if t.get("status") == "tamamlandi"])
-        progress = (completed_tasks / total_tasks * 100) if total_tasks > 0 else 0
+        rollups = legacy_rollups.get(project["id"], project)
         
-        area_count = await db.project_areas.count_documents({"project_id": project["id"]})
-
         project_data = {
             **project,
-            "progress": progress,
-            "area_count": area_count,
+            "progress": compute_progress(rollups["completed_task_count"], rollups["task_count"]),
+            "area_count": rollups["area_count"],
             "areas": [], 
             "assignments": [],
             "finance": ProjectFinanceSummary()
@@ -1014,56 +2772,24 @@ async def get_projects(status: str = None, user: dict = Depends(get_current_user
     
     return result
 
-async def create_project_area_internal(
-    project_id: str, tenant_id: str, user_id: str, user_name: str, area_data: ProjectAreaCreate
-):
+def build_project_area(project_id: str, tenant_id: str, area_data: ProjectAreaCreate, catalog: dict):
     area_id = str(uuid.uuid4())
     now = datetime.now(timezone.utc).isoformat()
     
     area_work_items_meta = []
     
-    subtasks_def = await db.subtasks.find({"tenant_id": tenant_id}, {"_id": 0}).sort("order", 1).to_list(1000)
-    groups_def = await db.groups.find({"tenant_id": tenant_id}, {"_id": 0}).to_list(100)
-    group_map = {g["id"]: g for g in groups_def}
-    
-    tasks_to_insert = []
-    
     for wi in area_data.work_items:
-        workitem_def = await db.workitems.find_one({"id": wi.work_item_id, "tenant_id": tenant_id}, {"_id": 0})
+        workitem_def = catalog["workitems"].get(wi.work_item_id)
         workitem_name = workitem_def["name"] if workitem_def else "Bilinmeyen İş Kalemi"
         
         area_work_items_meta.append({
             "work_item_id": wi.work_item_id,
             "work_item_name": workitem_name,
             "quantity": wi.quantity,
-            "notes": wi.notes
+            "notes": wi.notes,
+            "subtask_ids": [st["id"] for st in plan_workitem_subtasks(catalog, workitem_def)]
         })
         
-        for st_def in subtasks_def:
-            group_info = group_map.get(st_def["group_id"], {})
-            
-            task = {
-                "id": str(uuid.uuid4()),
-                "project_id": project_id,
-                "area_id": area_id,
-                "tenant_id": tenant_id,
-                "work_item_id": wi.work_item_id,
-                "work_item_name": workitem_name, 
-                "group_id": st_def["group_id"],
-                "group_name": group_info.get("name", ""),
-                "subtask_id": st_def["id"],
-                "subtask_name": st_def["name"],
-                "status": "bekliyor",
-                "notes": None,
-                "assigned_to": None,
-                "created_at": now,
-                "updated_at": now
-            }
-            tasks_to_insert.append(task)
-            
-    if tasks_to_insert:
-        await db.project_tasks.insert_many(tasks_to_insert)
-        
     area = {
         "id": area_id,
         "project_id": project_id,
@@ -1075,16 +2801,42 @@ async def create_project_area_internal(
         "work_items": area_work_items_meta,
         "agreed_price": area_data.agreed_price,
         "status": area_data.status,
+        "task_storage": TASK_STORAGE,
+        # Packs always hold the whole plan
+        "task_materialization": TASK_MATERIALIZATION if TASK_STORAGE == "documents" else "eager",
+        **AREA_ROLLUP_DEFAULTS,
         "created_at": now,
         "updated_at": now
     }
     
+    planned_tasks = expand_area_tasks(area, catalog)
+    area["task_count"] = len(planned_tasks)
+    area["status_counts"] = {"bekliyor": len(planned_tasks)} if planned_tasks else {}
+    return area, planned_tasks
+
+async def create_project_area_internal(
+    project_id: str, tenant_id: str, user_id: str, user_name: str, area_data: ProjectAreaCreate
+):
+    catalog = await resolve_workitems(tenant_id, [wi.work_item_id for wi in area_data.work_items])
+    area, planned_tasks = build_project_area(project_id, tenant_id, area_data, catalog)
+    
+    # Lazy areas keep untouched tasks virtual; rows appear on first update
+    await task_repository.insert(area, planned_tasks)
+    
     await db.project_areas.insert_one(area)
+    await inc_project_rollups(
+        project_id,
+        area_count=1,
+        task_count=len(planned_tasks),
+        total_agreed=area_data.agreed_price
+    )
+    touch_project(project_id)
+    invalidate_finance_report(tenant_id)
     
     await log_project_activity(
         project_id, tenant_id, user_id, user_name,
         "area_created", f"'{area_data.name}' alanı eklendi.",
-        area_id, area_data.name,
+        area["id"], area_data.name,
         {"agreed_price": area_data.agreed_price}
     )
     
@@ -1113,6 +2865,7 @@ async def create_project_assignment_internal(
     }
     
     await db.project_assignments.insert_one(assignment)
+    touch_project(project_id)
     
     project = await db.projects.find_one({"id": project_id}, {"name": 1, "_id": 0})
     project_name = project.get("name") if project else "Proje"
@@ -1146,12 +2899,31 @@ async def create_project_assignment_internal(
 async def create_project(data: ProjectCreate, user: dict = Depends(get_current_user)):
     check_permission(user, "projects.create")
     
+    tenant_id = user["tenant_id"]
     project_id = str(uuid.uuid4())
     now = datetime.now(timezone.utc).isoformat()
     
+    areas_data = [a if isinstance(a, ProjectAreaCreate) else ProjectAreaCreate(**a) for a in data.areas]
+    assignments_data = [
+        a if isinstance(a, ProjectAssignmentCreate) else ProjectAssignmentCreate(**a)
+        for a in data.assigned_users
+    ]
+    
+    # Validate everything before anything is written
+    catalog, assigned_users = await asyncio.gather(
+        resolve_workitems(tenant_id, [wi.work_item_id for a in areas_data for wi in a.work_items]),
+        db.users.find(
+            {"id": {"$in": list({a.user_id for a in assignments_data})}, "tenant_id": tenant_id},
+            {"_id": 0, "id": 1, "full_name": 1}
+        ).to_list(None)
+    )
+    users_by_id = {u["id"]: u for u in assigned_users}
+    if any(a.user_id not in users_by_id for a in assignments_data):
+        raise HTTPException(status_code=400, detail="Atanan kullanıcı bulunamadı")
+    
     project = {
         "id": project_id,
-        "tenant_id": user["tenant_id"],
+        "tenant_id": tenant_id,
         "name": data.name,
         "description": data.description,
         "customer_name": data.customer_name,
@@ -1160,44 +2932,88 @@ async def create_project(data: ProjectCreate, user: dict = Depends(get_current_u
         "status": "planlandi",
         "due_date": data.due_date,
         "created_by": user["id"],
+        **PROJECT_ROLLUP_DEFAULTS,
         "created_at": now,
         "updated_at": now
     }
+    documents = {
+        "projects": [project],
+        "project_areas": [],
+        "project_tasks": [],
+        "area_task_packs": [],
+        "project_assignments": [],
+        "project_activities": [build_activity(
+            project_id, tenant_id, user["id"], user["full_name"],
+            "project_created", f"'{data.name}' projesi oluşturuldu."
+        )],
+        "notifications": []
+    }
     
-    await db.projects.insert_one(project)
-    
-    await log_project_activity(
-        project_id, user["tenant_id"], user["id"], user["full_name"],
-        "project_created", f"'{data.name}' projesi oluşturuldu."
-    )
+    area_names = {}
+    for area_data in areas_data:
+        area, planned_tasks = build_project_area(project_id, tenant_id, area_data, catalog)
+        area_names[area["id"]] = area["name"]
+        documents["project_areas"].append(area)
+        for collection, rows in task_repository.rows(area, planned_tasks).items():
+            documents[collection] += rows
+        
+        project["area_count"] += 1
+        project["task_count"] += area["task_count"]
+        project["total_agreed"] += area_data.agreed_price
+        documents["project_activities"].append(build_activity(
+            project_id, tenant_id, user["id"], user["full_name"],
+            "area_created", f"'{area_data.name}' alanı eklendi.",
+            area["id"], area_data.name,
+            {"agreed_price": area_data.agreed_price}
+        ))
+    
+    for assignment_data in assignments_data:
+        assigned_user = users_by_id[assignment_data.user_id]
+        area_name = area_names.get(assignment_data.area_id) if assignment_data.assignment_type == "area" else None
+        
+        documents["project_assignments"].append({
+            "id": str(uuid.uuid4()),
+            "project_id": project_id,
+            "tenant_id": tenant_id,
+            "user_id": assignment_data.user_id,
+            "assignment_type": assignment_data.assignment_type,
+            "area_id": assignment_data.area_id,
+            "created_at": now
+        })
+        
+        if assignment_data.user_id != user["id"]:
+            if assignment_data.assignment_type == "area":
+                msg = f"'{data.name}' projesinin '{area_name}' alanına atandınız."
+            else:
+                msg = f"'{data.name}' projesine atandınız."
+            documents["notifications"].append(build_notification(
+                assignment_data.user_id, tenant_id, "Projeye Atandınız", msg, "info", f"/projects/{project_id}"
+            ))
+        
+        documents["project_activities"].append(build_activity(
+            project_id, tenant_id, user["id"], user["full_name"],
+            "staff_assigned",
+            f"{assigned_user['full_name']} {'projeye' if assignment_data.assignment_type == 'project' else f'{area_name} alanına'} atandı.",
+            assignment_data.area_id, area_name,
+            {"assigned_user_id": assignment_data.user_id, "assigned_user_name": assigned_user["full_name"]}
+        ))
     
-    for area_data in data.areas:
-        if hasattr(area_data, 'model_dump'):
-             area_obj = area_data
-        else:
-             area_obj = ProjectAreaCreate(**area_data)
-
-        await create_project_area_internal(
-            project_id, user["tenant_id"], user["id"], user["full_name"], area_obj
-        )
+    await insert_documents_atomically(documents)
+    touch_project(project_id)
+    invalidate_finance_report(tenant_id)
     
-    for assignment_data in data.assigned_users:
-        if isinstance(assignment_data, dict):
-            assignment_obj = ProjectAssignmentCreate(**assignment_data)
-        else:
-            assignment_obj = assignment_data
-            
-        await create_project_assignment_internal(
-            project_id, user["tenant_id"], user["id"], user["full_name"], assignment_obj
-        )
+    # Only announce what has been committed
+    await asyncio.gather(*[push_notification(n) for n in documents["notifications"]])
     
-    return project
+    return {k: v for k, v in project.items() if k != "_id"}
 
 @api_router.get("/projects/{project_id}")
 async def get_project(project_id: str, user: dict = Depends(get_current_user)):
     if user.get("is_admin") is False:
-         is_assigned = await db.project_assignments.find_one({"project_id": project_id, "user_id": user["id"]})
-         is_creator = await db.projects.find_one({"id": project_id, "created_by": user["id"]})
+         is_assigned, is_creator = await asyncio.gather(
+             db.project_assignments.find_one({"project_id": project_id, "user_id": user["id"]}, {"_id": 1}),
+             db.projects.find_one({"id": project_id, "created_by": user["id"]}, {"_id": 1})
+         )
          has_perm = False
          try:
              check_permission(user, "projects.view")
@@ -1211,53 +3027,66 @@ async def get_project(project_id: str, user: dict = Depends(get_current_user)):
               except:
                   raise HTTPException(status_code=403, detail="Erişim yetkiniz yok")
 
-    project = await db.projects.find_one({"id": project_id, "tenant_id": user["tenant_id"]}, {"_id": 0})
+    version = project_versions.get(project_id)
+    cached = project_detail_cache.get(project_id)
+    if cached and cached[0] == version:
+        if cached[1] != user["tenant_id"]:
+            raise HTTPException(status_code=404, detail="Proje bulunamadı")
+        return cached[2]
+    
+    detail = await build_project_detail(project_id, user["tenant_id"])
+    project_detail_cache.set(
+        project_id,
+        (version, user["tenant_id"], detail),
+        size=len(json.dumps(detail, default=str))
+    )
+    return detail
+
+async def build_project_detail(project_id: str, tenant_id: str) -> dict:
+    project, areas, assignments = await asyncio.gather(
+        db.projects.find_one({"id": project_id, "tenant_id": tenant_id}, {"_id": 0}),
+        db.project_areas.find({"project_id": project_id}, {"_id": 0}).to_list(100),
+        db.project_assignments.find({"project_id": project_id}, {"_id": 0}).to_list(100)
+    )
     if not project:
         raise HTTPException(status_code=404, detail="Proje bulunamadı")
     
-    creator = await db.users.find_one({"id": project.get("created_by")}, {"full_name": 1, "_id": 0})
-    creator_name = creator.get("full_name") if creator else None
+    users_task = resolve_users(tenant_id, {a["user_id"] for a in assignments} | {project.get("created_by")})
+    
+    project_rollups, area_rollups = project, {a["id"]: a for a in areas}
+    if not has_rollups(project) or not all(has_rollups(a) for a in areas):
+        users, (legacy_projects, area_rollups) = await asyncio.gather(users_task, compute_rollups([project_id]))
+        project_rollups = legacy_projects[project_id]
+    else:
+        users = await users_task
     
-    areas = await db.project_areas.find({"project_id": project_id}, {"_id": 0}).to_list(100)
+    user_names = {user_id: u["full_name"] for user_id, u in users.items()}
+    area_names = {a["id"]: a.get("name") for a in areas}
+    creator_name = user_names.get(project.get("created_by"))
     
     area_responses = []
     for area in areas:
-        payments = await db.project_payments.find({"area_id": area["id"]}, {"amount": 1, "_id": 0}).to_list(1000)
-        collected = sum(p.get("amount", 0) for p in payments)
-        
-        area_tasks = await db.project_tasks.find({"area_id": area["id"]}, {"status": 1, "_id": 0}).to_list(1000)
-        total = len(area_tasks)
-        completed = len([t for t in area_tasks if t.get("status") == "tamamlandi"])
-        progress = (completed / total * 100) if total > 0 else 0
+        rollups = area_rollups.get(area["id"], AREA_ROLLUP_DEFAULTS)
+        collected = rollups["collected_amount"]
         
         area_responses.append({
             **area,
             "collected_amount": collected,
             "remaining_amount": area.get("agreed_price", 0) - collected,
-            "progress": progress
+            "progress": compute_progress(rollups["completed_task_count"], rollups["task_count"])
         })
     
-    assignments = await db.project_assignments.find({"project_id": project_id}, {"_id": 0}).to_list(100)
     assignment_responses = []
     for a in assignments:
-        assigned_user = await db.users.find_one({"id": a["user_id"]}, {"full_name": 1, "_id": 0})
-        area_name = None
-        if a.get("area_id"):
-            area = await db.project_areas.find_one({"id": a["area_id"]}, {"name": 1, "_id": 0})
-            area_name = area.get("name") if area else None
         assignment_responses.append({
             **a,
-            "user_name": assigned_user.get("full_name") if assigned_user else "Bilinmiyor",
-            "area_name": area_name
+            "user_name": user_names[a["user_id"]] if a["user_id"] in user_names else "Bilinmiyor",
+            "area_name": area_names.get(a["area_id"]) if a.get("area_id") else None
         })
     
-    total_agreed = sum(a.get("agreed_price", 0) for a in area_responses)
-    total_collected = sum(a.get("collected_amount", 0) for a in area_responses)
-    
-    all_tasks = await db.project_tasks.find({"project_id": project_id}, {"status": 1, "_id": 0}).to_list(1000)
-    total_tasks = len(all_tasks)
-    completed_tasks = len([t for t in all_tasks if t.get("status") == "tamamlandi"])
-    progress = (completed_tasks / total_tasks * 100) if total_tasks > 0 else 0
+    total_agreed = project_rollups["total_agreed"]
+    total_collected = project_rollups["total_collected"]
+    progress = compute_progress(project_rollups["completed_task_count"], project_rollups["task_count"])
     
     return {
         **project,
@@ -1305,6 +3134,8 @@ async def update_project(project_id: str, data: ProjectUpdate, user: dict = Depe
         {"id": project_id, "tenant_id": user["tenant_id"]},
         {"$set": update_data}
     )
+    touch_project(project_id)
+    invalidate_finance_report(user["tenant_id"])
     
     return await get_project(project_id, user)
 
@@ -1313,7 +3144,7 @@ async def delete_project(project_id: str, user: dict = Depends(get_current_user)
     check_permission(user, "projects.delete")
     await check_project_lock(project_id, user)
     
-    await db.project_tasks.delete_many({"project_id": project_id})
+    await task_repository.delete_project(project_id)
     await db.project_areas.delete_many({"project_id": project_id})
     await db.project_assignments.delete_many({"project_id": project_id})
     await db.project_payments.delete_many({"project_id": project_id})
@@ -1321,6 +3152,8 @@ async def delete_project(project_id: str, user: dict = Depends(get_current_user)
     await db.files.delete_many({"project_id": project_id})
     
     result = await db.projects.delete_one({"id": project_id, "tenant_id": user["tenant_id"]})
+    touch_project(project_id)
+    invalidate_finance_report(user["tenant_id"])
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Proje bulunamadı")
     
@@ -1348,18 +3181,28 @@ async def update_project_area(project_id: str, area_id: str, data: ProjectAreaUp
     check_permission(user, "projects.edit")
     await check_project_lock(project_id, user) 
     
-    area = await db.project_areas.find_one({"id": area_id, "project_id": project_id}, {"_id": 0})
-    if not area:
-        raise HTTPException(status_code=404, detail="Alan bulunamadı")
-    
     update_data = {k: v for k, v in data.model_dump().items() if v is not None}
     update_data["updated_at"] = datetime.now(timezone.utc).isoformat()
     
-    await db.project_areas.update_one({"id": area_id}, {"$set": update_data})
+    area = await db.project_areas.find_one_and_update(
+        {"id": area_id, "project_id": project_id},
+        {"$set": update_data},
+        {"_id": 0}
+    )
+    if not area:
+        raise HTTPException(status_code=404, detail="Alan bulunamadı")
+    
+    if "agreed_price" in update_data and update_data["agreed_price"] != area.get("agreed_price", 0):
+        await inc_project_rollups(project_id, total_agreed=update_data["agreed_price"] - area.get("agreed_price", 0))
+    touch_project(project_id)
+    invalidate_finance_report(user["tenant_id"])
     
-    updated_area = await db.project_areas.find_one({"id": area_id}, {"_id": 0})
-    payments = await db.project_payments.find({"area_id": area_id}, {"amount": 1, "_id": 0}).to_list(1000)
-    collected = sum(p.get("amount", 0) for p in payments)
+    updated_area = {**area, **update_data}
+    if has_rollups(updated_area):
+        collected = updated_area["collected_amount"]
+    else:
+        payments = await db.project_payments.find({"area_id": area_id}, {"amount": 1, "_id": 0}).to_list(1000)
+        collected = sum(p.get("amount", 0) for p in payments)
     
     return {
         **updated_area,
@@ -1372,14 +3215,27 @@ async def delete_project_area(project_id: str, area_id: str, user: dict = Depend
     check_permission(user, "projects.edit")
     await check_project_lock(project_id, user) 
     
-    area = await db.project_areas.find_one({"id": area_id, "project_id": project_id}, {"_id": 0})
+    area = await db.project_areas.find_one_and_delete({"id": area_id, "project_id": project_id}, {"_id": 0})
     if not area:
         raise HTTPException(status_code=404, detail="Alan bulunamadı")
     
-    await db.project_tasks.delete_many({"area_id": area_id})
+    await task_repository.delete_area(area_id)
     await db.project_payments.delete_many({"area_id": area_id})
     await db.project_assignments.delete_many({"area_id": area_id})
-    await db.project_areas.delete_one({"id": area_id})
+    
+    if has_rollups(area):
+        await inc_project_rollups(
+            project_id,
+            area_count=-1,
+            task_count=-area["task_count"],
+            completed_task_count=-area["completed_task_count"],
+            total_agreed=-area.get("agreed_price", 0),
+            total_collected=-area["collected_amount"]
+        )
+    else:
+        await repair_rollups([project_id])
+    touch_project(project_id)
+    invalidate_finance_report(user["tenant_id"])
     
     await log_project_activity(
         project_id, user["tenant_id"], user["id"], user["full_name"],
@@ -1426,6 +3282,7 @@ async def delete_project_assignment(project_id: str, assignment_id: str, user: d
     assigned_user = await db.users.find_one({"id": assignment["user_id"]}, {"full_name": 1, "_id": 0})
     
     await db.project_assignments.delete_one({"id": assignment_id})
+    touch_project(project_id)
     
     await log_project_activity(
         project_id, user["tenant_id"], user["id"], user["full_name"],
@@ -1459,13 +3316,19 @@ async def create_project_payment(project_id: str, data: ProjectPaymentCreate, us
     }
     
     await db.project_payments.insert_one(payment)
+    await inc_area_rollups(data.area_id, collected_amount=data.amount)
+    await inc_project_rollups(project_id, total_collected=data.amount)
+    touch_project(project_id)
+    invalidate_finance_report(user["tenant_id"])
     
     await log_project_activity(
         project_id, user["tenant_id"], user["id"], user["full_name"],
         "payment_added",
         f"'{area['name']}' alanı için {data.amount:,.2f} ₺ tahsilat kaydedildi.",
         data.area_id, area["name"],
-        {"amount": data.amount, "method": data.payment_method}
+        {"amount": data.amount, "method": data.payment_method},
+        # Finance audit trail must not sit in a buffer that a crash could drop
+        durable=True
     )
     
     return {
@@ -1475,154 +3338,360 @@ async def create_project_payment(project_id: str, data: ProjectPaymentCreate, us
     }
 
 @api_router.get("/projects/{project_id}/payments")
-async def get_project_payments(project_id: str, user: dict = Depends(get_current_user)):
-    payments = await db.project_payments.find({"project_id": project_id}, {"_id": 0}).sort("payment_date", -1).to_list(1000)
+async def get_project_payments(
+    project_id: str,
+    response: Response,
+    cursor: str = None,
+    limit: int = PAYMENTS_PAGE_SIZE,
+    user: dict = Depends(get_current_user)
+):
+    limit = clamp_page_size(limit)
+    query = {"project_id": project_id}
+    if cursor:
+        last_payment_date, last_id = decode_cursor(cursor, 2)
+        query.update(keyset_condition("payment_date", last_payment_date, last_id))
+    
+    payments, areas = await asyncio.gather(
+        db.project_payments.find(query, {"_id": 0}).sort(
+            [("payment_date", -1), ("id", -1)]
+        ).limit(limit + 1).to_list(limit + 1),
+        db.project_areas.find(
+            {"project_id": project_id, "tenant_id": user["tenant_id"]},
+            {"id": 1, "name": 1, "_id": 0}
+        ).to_list(100)
+    )
     
-    result = []
-    for p in payments:
-        area = await db.project_areas.find_one({"id": p["area_id"]}, {"name": 1, "_id": 0})
-        creator = await db.users.find_one({"id": p["created_by"]}, {"full_name": 1, "_id": 0})
-        result.append({
-            **p,
-            "area_name": area.get("name") if area else "Silinmiş Alan",
-            "created_by_name": creator.get("full_name") if creator else "Bilinmiyor"
-        })
+    if len(payments) > limit:
+        payments = payments[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(payments[-1]["payment_date"], payments[-1]["id"])
     
-    return result
+    # Per-area collected/remaining totals come with the project detail rollups
+    users = await resolve_users(user["tenant_id"], {p.get("created_by") for p in payments})
+    area_names = {a["id"]: a.get("name") for a in areas}
+    
+    return [
+        {
+            **p,
+            "area_name": area_names.get(p["area_id"], "Silinmiş Alan"),
+            "created_by_name": users.get(p.get("created_by"), {}).get("full_name", "Bilinmiyor")
+        }
+        for p in payments
+    ]
 
 @api_router.delete("/projects/{project_id}/payments/{payment_id}")
 async def delete_project_payment(project_id: str, payment_id: str, user: dict = Depends(get_current_user)):
     check_permission(user, "projects.manage_finance")
     await check_project_lock(project_id, user) 
     
-    payment = await db.project_payments.find_one({"id": payment_id, "project_id": project_id}, {"_id": 0})
+    payment = await db.project_payments.find_one_and_delete({"id": payment_id, "project_id": project_id}, {"_id": 0})
     if not payment:
         raise HTTPException(status_code=404, detail="Tahsilat bulunamadı")
     
-    area = await db.project_areas.find_one({"id": payment["area_id"]}, {"name": 1, "_id": 0})
+    await inc_area_rollups(payment["area_id"], collected_amount=-payment["amount"])
+    await inc_project_rollups(project_id, total_collected=-payment["amount"])
+    touch_project(project_id)
+    invalidate_finance_report(user["tenant_id"])
     
-    await db.project_payments.delete_one({"id": payment_id})
+    area = await db.project_areas.find_one({"id": payment["area_id"]}, {"name": 1, "_id": 0})
     
     await log_project_activity(
         project_id, user["tenant_id"], user["id"], user["full_name"],
         "payment_deleted",
         f"{payment['amount']:,.2f} ₺ tahsilat silindi.",
-        payment["area_id"], area.get("name") if area else None
+        payment["area_id"], area.get("name") if area else None,
+        durable=True
     )
     
     return {"message": "Tahsilat silindi"}
 
 # ==================== PROJECT ACTIVITY ROUTES ====================
 
+async def page_activities(response: Response, query: dict, cursor: Optional[str], limit: int) -> List[dict]:
+    limit = clamp_page_size(limit)
+    # History is usually refetched right after a mutation, so land its buffered activities first
+    await activity_writer.sync(query["tenant_id"])
+    if cursor:
+        last_created_at, last_id = decode_cursor(cursor, 2)
+        query = {"$and": [query, keyset_condition("created_at", last_created_at, last_id)]}
+    
+    activities = await db.project_activities.find(query, {"_id": 0}).sort(
+        [("created_at", -1), ("id", -1)]
+    ).limit(limit + 1).to_list(limit + 1)
+    
+    if len(activities) > limit:
+        activities = activities[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(activities[-1]["created_at"], activities[-1]["id"])
+    return activities
+
 @api_router.get("/projects/{project_id}/activities")
-async def get_project_activities(project_id: str, limit: int = 50, user: dict = Depends(get_current_user)):
-    activities = await db.project_activities.find(
-        {"project_id": project_id},
-        {"_id": 0}
-    ).sort("created_at", -1).limit(limit).to_list(limit)
+async def get_project_activities(
+    project_id: str,
+    response: Response,
+    cursor: str = None,
+    limit: int = ACTIVITIES_PAGE_SIZE,
+    user: dict = Depends(get_current_user)
+):
+    return await page_activities(response, {"project_id": project_id, "tenant_id": user["tenant_id"]}, cursor, limit)
+
+@api_router.get("/activities")
+async def get_activities(
+    response: Response,
+    cursor: str = None,
+    limit: int = ACTIVITIES_PAGE_SIZE,
+    action: str = None,
+    user_id: str = None,
+    area_id: str = None,
+    user: dict = Depends(get_current_user)
+):
+    query = {"tenant_id": user["tenant_id"]}
+    if action:
+        query["action"] = action
+    if user_id:
+        query["user_id"] = user_id
+    if area_id:
+        query["area_id"] = area_id
     
-    return activities
+    # Without view_all the feed covers only projects the user is assigned to or created
+    has_view_all = user.get("is_admin") or any(p in user.get("permissions", []) for p in ("projects.view_all", "*"))
+    if not has_view_all:
+        assigned_ids, created_ids = await asyncio.gather(
+            db.project_assignments.distinct("project_id", {"user_id": user["id"]}),
+            db.projects.distinct("id", {"tenant_id": user["tenant_id"], "created_by": user["id"]})
+        )
+        query["project_id"] = {"$in": list(set(assigned_ids) | set(created_ids))}
+    
+    return await page_activities(response, query, cursor, limit)
 
 # ==================== PROJECT TASK ROUTES ====================
 
 @api_router.get("/projects/{project_id}/tasks")
 async def get_project_tasks(project_id: str, area_id: str = None, user: dict = Depends(get_current_user)):
-    query = {"project_id": project_id}
-    if area_id:
-        query["area_id"] = area_id
-    
-    tasks = await db.project_tasks.find(query, {"_id": 0}).to_list(1000)
+    tasks = await task_repository.list(project_id, user["tenant_id"], area_id)
+    users = await resolve_users(user["tenant_id"], {t.get("assigned_to") for t in tasks})
     
-    result = []
-    for task in tasks:
-        assigned_to_name = None
-        if task.get("assigned_to"):
-            assigned_user = await db.users.find_one({"id": task["assigned_to"]}, {"full_name": 1, "_id": 0})
-            if assigned_user:
-                assigned_to_name = assigned_user["full_name"]
-        result.append({**task, "assigned_to_name": assigned_to_name})
-    
-    return result
+    return [
+        {**task, "assigned_to_name": users.get(task.get("assigned_to"), {}).get("full_name")}
+        for task in tasks
+    ]
 
-@api_router.put("/projects/{project_id}/tasks/{task_id}")
-async def update_project_task(project_id: str, task_id: str, data: dict, user: dict = Depends(get_current_user)):
-    check_permission(user, "tasks.edit")
-    await check_project_lock(project_id, user)
-    
-    task = await db.project_tasks.find_one({"id": task_id, "project_id": project_id})
-    if not task:
-        raise HTTPException(status_code=404, detail="Görev bulunamadı")
+async def apply_task_changes(project_id: str, changes: List[dict], user: dict) -> dict:
+    # Statuses become rollup keys, so reject unknown values before anything is written
+    invalid = [c["id"] for c in changes if c.get("status") is not None and c["status"] not in TASK_STATUS_CODES]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Geçersiz görev durumu: {', '.join(invalid)}")
     
-    update_fields = {"updated_at": datetime.now(timezone.utc).isoformat()}
+    tasks = await task_repository.get_many(project_id, [c["id"] for c in changes], user["tenant_id"])
+    now = datetime.now(timezone.utc).isoformat()
     
-    # Status Update
-    if "status" in data and data["status"] != task["status"]:
-        update_fields["status"] = data["status"]
-        await log_project_activity(
-            project_id, user["tenant_id"], user["id"], user["full_name"],
-            "task_status_changed",
-            f"'{task['subtask_name']}' durumu: {task['status']} -> {data['status']}",
-            area_id=task.get("area_id")
-        )
+    planned = []
+    for change in changes:
+        task = tasks.get(change["id"])
+        if not task:
+            continue
+        update_fields = {"updated_at": now}
+        status_changed = change.get("status") is not None and change["status"] != task["status"]
+        assignee_changed = "assigned_to" in change and change["assigned_to"] != task.get("assigned_to")
         
-    # Note Update
-    if "notes" in data:
-        update_fields["notes"] = data["notes"]
-        # Explicit user request: Log note updates
-        note_snippet = (data["notes"][:30] + '...') if len(data["notes"]) > 30 else data["notes"]
-        await log_project_activity(
-            project_id, user["tenant_id"], user["id"], user["full_name"],
-            "note_updated",
-            f"'{task['subtask_name']}' görevine not eklendi: {note_snippet}",
-            area_id=task.get("area_id")
-        )
-
-    # Assignment Update
-    if "assigned_to" in data and data["assigned_to"] != task.get("assigned_to"):
-        update_fields["assigned_to"] = data["assigned_to"]
+        if status_changed:
+            update_fields["status"] = change["status"]
+        if "notes" in change:
+            update_fields["notes"] = change["notes"]
+        if assignee_changed:
+            update_fields["assigned_to"] = change["assigned_to"]
+        
+        # Guard on the previous status so concurrent edits cannot double-count rollups
+        planned.append((task, update_fields, task["status"] if status_changed else None))
+    
+    applied = await task_repository.update_many(planned)
+    
+    activities = []
+    assignments = []
+    completed_deltas = {}
+    status_deltas = {}
+    for task, update_fields, expected_status in planned:
+        if task["id"] not in applied:
+            continue
+        area_id = task.get("area_id")
         
-        if data["assigned_to"]:
-            project = await db.projects.find_one({"id": project_id})
-            await create_notification(
-                data["assigned_to"],
+        # Status Update
+        if "status" in update_fields:
+            activities.append(build_activity(
+                project_id, user["tenant_id"], user["id"], user["full_name"],
+                "task_status_changed",
+                f"'{task['subtask_name']}' durumu: {task['status']} -> {update_fields['status']}",
+                area_id=area_id
+            ))
+            
+            was_completed = task["status"] == "tamamlandi"
+            is_completed = update_fields["status"] == "tamamlandi"
+            if was_completed != is_completed:
+                completed_deltas[area_id] = completed_deltas.get(area_id, 0) + (1 if is_completed else -1)
+            if area_id:
+                area_deltas = status_deltas.setdefault(area_id, {})
+                area_deltas[task["status"]] = area_deltas.get(task["status"], 0) - 1
+                area_deltas[update_fields["status"]] = area_deltas.get(update_fields["status"], 0) + 1
+        
+        # Note Update
+        if "notes" in update_fields:
+            notes = update_fields["notes"] or ""
+            note_snippet = (notes[:30] + '...') if len(notes) > 30 else notes
+            activities.append(build_activity(
+                project_id, user["tenant_id"], user["id"], user["full_name"],
+                "note_updated",
+                f"'{task['subtask_name']}' görevine not eklendi: {note_snippet}",
+                area_id=area_id
+            ))
+        
+        # Assignment Update
+        if update_fields.get("assigned_to"):
+            assignments.append((task, update_fields["assigned_to"]))
+    
+    notifications = []
+    if assignments:
+        project, users = await asyncio.gather(
+            db.projects.find_one({"id": project_id}, {"name": 1, "_id": 0}),
+            resolve_users(user["tenant_id"], {assignee for _, assignee in assignments})
+        )
+        names = {user_id: u["full_name"] for user_id, u in users.items()}
+        for task, assignee in assignments:
+            notifications.append(build_notification(
+                assignee,
                 user["tenant_id"],
                 "Görev Atandı",
-                f"'{project.get('name', '')}' projesinde size '{task['subtask_name']}' görevi atandı.",
+                f"'{(project or {}).get('name', '')}' projesinde size '{task['subtask_name']}' görevi atandı.",
                 "info",
                 f"/projects/{project_id}"
-            )
-            
-            assigned_user = await db.users.find_one({"id": data["assigned_to"]})
-            u_name = assigned_user["full_name"] if assigned_user else "Personel"
-            
-            await log_project_activity(
+            ))
+            activities.append(build_activity(
                 project_id, user["tenant_id"], user["id"], user["full_name"],
                 "staff_assigned",
-                f"'{task['subtask_name']}' görevi {u_name} kişisine atandı.",
+                f"'{task['subtask_name']}' görevi {names.get(assignee, 'Personel')} kişisine atandı.",
                 area_id=task.get("area_id")
-            )
+            ))
     
-    await db.project_tasks.update_one({"id": task_id}, {"$set": update_fields})
+    await activity_writer.write(activities)
+    if notifications:
+        await db.notifications.insert_many(notifications)
     
-    # Area Status Logic
-    if task.get("area_id"):
-        area_tasks = await db.project_tasks.find({"area_id": task["area_id"]}, {"status": 1, "_id": 0}).to_list(1000)
-        statuses = [t.get("status", "bekliyor") for t in area_tasks]
-        statuses = [statuses] if isinstance(statuses, str) else statuses # Safety check
-        
-        if "status" in data: # Only recalculate on status change
-            new_area_status = "planlandi"
-            if statuses and all(s == "tamamlandi" for s in statuses):
-                new_area_status = "tamamlandi"
-            elif any(s == "montaj" for s in statuses):
-                new_area_status = "montaj"
-            elif any(s == "uretimde" for s in statuses):
-                new_area_status = "uretimde"
-            
-            await db.project_areas.update_one(
-                {"id": task["area_id"]},
-                {"$set": {"status": new_area_status, "updated_at": datetime.now(timezone.utc).isoformat()}}
-            )
+    for area_id, delta in completed_deltas.items():
+        if area_id and delta:
+            await inc_area_rollups(area_id, completed_task_count=delta)
+    project_completed_delta = sum(completed_deltas.values())
+    if project_completed_delta:
+        await inc_project_rollups(project_id, completed_task_count=project_completed_delta)
+    
+    # Area Status Logic: one histogram update per affected area
+    for area_id, deltas in status_deltas.items():
+        await update_area_status(area_id, deltas)
+    
+    if applied:
+        touch_project(project_id)
+    await asyncio.gather(*[push_notification(n) for n in notifications])
+    
+    applied_ids = [task["id"] for task, _, _ in planned if task["id"] in applied]
+    return {
+        "updated": applied_ids,
+        "conflicts": [task["id"] for task, _, _ in planned if task["id"] not in applied],
+        "not_found": [c["id"] for c in changes if c["id"] not in tasks]
+    }
+
+@api_router.patch("/projects/{project_id}/tasks")
+async def update_project_tasks(project_id: str, data: ProjectTaskBulkUpdate, user: dict = Depends(get_current_user)):
+    check_permission(user, "tasks.edit")
+    await check_project_lock(project_id, user)
+    
+    if len(data.tasks) > MAX_TASK_BATCH:
+        raise HTTPException(status_code=400, detail=f"Tek seferde en fazla {MAX_TASK_BATCH} görev güncellenebilir")
+    changes = [change.model_dump(exclude_unset=True) for change in data.tasks]
+    if len({c["id"] for c in changes}) != len(changes):
+        raise HTTPException(status_code=400, detail="Aynı görev birden fazla kez gönderildi")
+    
+    return await apply_task_changes(project_id, changes, user)
+
+@api_router.get("/projects/{project_id}/tasks/summary")
+async def get_project_task_summary(
+    project_id: str,
+    area_id: str = None,
+    group_id: str = None,
+    status: str = None,
+    include_ids: bool = False,
+    user: dict = Depends(get_current_user)
+):
+    project = await db.projects.find_one({"id": project_id, "tenant_id": user["tenant_id"]}, {"_id": 1})
+    if not project:
+        raise HTTPException(status_code=404, detail="Proje bulunamadı")
+    
+    # Ids are opt-in and only for a single bucket, so the board can load that bucket lazily
+    filters = {k: v for k, v in (("area_id", area_id), ("group_id", group_id), ("status", status)) if v}
+    with_ids = include_ids and len(filters) == 3
+    buckets = await task_repository.summary(project_id, user["tenant_id"], filters, with_ids=with_ids)
+    
+    by_status = {}
+    for bucket in buckets:
+        by_status[bucket["status"]] = by_status.get(bucket["status"], 0) + bucket["count"]
+    
+    return {
+        "buckets": buckets,
+        "by_status": by_status,
+        "total": sum(by_status.values())
+    }
+
+@api_router.get("/projects/{project_id}/tasks/export")
+async def export_project_tasks(
+    project_id: str,
+    format: str = "ndjson",
+    area_id: str = None,
+    group_id: str = None,
+    status: str = None,
+    user: dict = Depends(get_current_user)
+):
+    if format not in ("ndjson", "json"):
+        raise HTTPException(status_code=400, detail="Geçersiz format, 'ndjson' veya 'json' olmalı")
+    project = await db.projects.find_one({"id": project_id, "tenant_id": user["tenant_id"]}, {"_id": 1})
+    if not project:
+        raise HTTPException(status_code=404, detail="Proje bulunamadı")
+    
+    filters = {k: v for k, v in (("group_id", group_id), ("status", status)) if v}
+    
+    async def rows():
+        users = await resolve_users(user["tenant_id"], [])
+        async for task in task_repository.stream(project_id, user["tenant_id"], filters, area_id):
+            # Assignees are only known as rows stream in; an unknown one reloads the directory
+            assignee = task.get("assigned_to")
+            if assignee and assignee not in users:
+                users = await resolve_users(user["tenant_id"], {assignee})
+            assigned_to_name = users.get(task.get("assigned_to"), {}).get("full_name")
+            yield json.dumps({**task, "assigned_to_name": assigned_to_name}, ensure_ascii=False, default=str)
+    
+    async def ndjson_body():
+        async for row in rows():
+            yield row + "\n"
+    
+    async def json_body():
+        yield "["
+        first = True
+        async for row in rows():
+            yield row if first else "," + row
+            first = False
+        yield "]"
+    
+    return StreamingResponse(
+        ndjson_body() if format == "ndjson" else json_body(),
+        media_type="application/x-ndjson" if format == "ndjson" else "application/json",
+        headers={"Content-Disposition": f'attachment; filename="tasks-{project_id}.{format}"'}
+    )
+
+@api_router.put("/projects/{project_id}/tasks/{task_id}")
+async def update_project_task(project_id: str, task_id: str, data: dict, user: dict = Depends(get_current_user)):
+    check_permission(user, "tasks.edit")
+    await check_project_lock(project_id, user)
+    
+    change = {k: data[k] for k in ("status", "notes", "assigned_to") if k in data}
+    result = await apply_task_changes(project_id, [{**change, "id": task_id}], user)
+    if result["not_found"]:
+        raise HTTPException(status_code=404, detail="Görev bulunamadı")
+    if result["conflicts"]:
+        raise HTTPException(status_code=409, detail="Görev başka bir kullanıcı tarafından güncellendi, lütfen tekrar deneyin")
     
     return {"message": "Görev güncellendi"}
 
@@ -1645,7 +3714,7 @@ async def create_user(data: UserCreate, user: dict = Depends(get_current_user)):
     new_user = {
         "id": str(uuid.uuid4()),
         "email": data.email,
-        "password": hash_password(data.password),
+        "password": await hash_password(data.password),
         "full_name": data.full_name,
         "tenant_id": user["tenant_id"],
         "role_id": data.role_id,
@@ -1654,6 +3723,7 @@ async def create_user(data: UserCreate, user: dict = Depends(get_current_user)):
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     await db.users.insert_one(new_user)
+    invalidate_user_directory(user["tenant_id"])
     
     return UserResponse(
         id=new_user["id"],
@@ -1679,6 +3749,9 @@ async def update_user(user_id: str, data: UserUpdate, current_user: dict = Depen
         {"id": user_id, "tenant_id": current_user["tenant_id"]},
         {"$set": update_data}
     )
+    invalidate_user_principal(user_id)
+    invalidate_user_directory(current_user["tenant_id"])
+    project_detail_cache.clear()
     
     updated_user = await db.users.find_one({"id": user_id}, {"_id": 0, "password": 0})
     if not updated_user:
@@ -1700,6 +3773,10 @@ async def delete_user(user_id: str, user: dict = Depends(get_current_user)):
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Kullanıcı bulunamadı")
     
+    await db.sessions.delete_many({"user_id": user_id})
+    invalidate_user_principal(user_id)
+    invalidate_user_directory(user["tenant_id"])
+    project_detail_cache.clear()
     return {"message": "Kullanıcı silindi"}
 
 # ==================== NOTIFICATION ROUTES ====================
@@ -1774,7 +3851,7 @@ async def upload_file(
     await db.files.insert_one(file_doc)
     
     if task_id and project_id:
-        task = await db.project_tasks.find_one({"id": task_id})
+        task = await task_repository.get(project_id, task_id, user["tenant_id"])
         task_name = task["subtask_name"] if task else "Görev"
         await log_project_activity(
             project_id, user["tenant_id"], user["id"], user["full_name"],
@@ -1849,6 +3926,123 @@ async def get_public_file(file_id: str):
         media_type=file_doc.get("content_type", "application/octet-stream")
     )
 
+# ==================== FINANCE REPORT ====================
+
+FINANCE_AGING_BUCKETS = ("current", "1_30", "31_60", "61_90", "90_plus", "no_due_date")
+FINANCE_REPORT_MONTHS = 12
+FINANCE_TOP_CUSTOMERS = 10
+
+async def build_finance_report(tenant_id: str) -> dict:
+    # Projects created before rollups existed are repaired once so the aggregation can rely on them
+    legacy_ids = await db.projects.distinct("id", {"tenant_id": tenant_id, "task_count": {"$exists": False}})
+    if legacy_ids:
+        await repair_rollups(legacy_ids)
+    
+    now = datetime.now(timezone.utc)
+    year, month = now.year, now.month - (FINANCE_REPORT_MONTHS - 1)
+    while month <= 0:
+        month += 12
+        year -= 1
+    since = f"{year:04d}-{month:02d}-01"
+    
+    outstanding_only = {"$match": {"outstanding": {"$gt": 0}}}
+    receivables, collections = await asyncio.gather(
+        db.projects.aggregate([
+            {"$match": {"tenant_id": tenant_id}},
+            {"$project": {
+                "_id": 0,
+                "customer_name": 1,
+                "total_agreed": 1,
+                "total_collected": 1,
+                "outstanding": {"$subtract": ["$total_agreed", "$total_collected"]},
+                "due": {"$dateFromString": {"dateString": "$due_date", "onError": None, "onNull": None}}
+            }},
+            {"$facet": {
+                "totals": [{"$group": {
+                    "_id": None,
+                    "agreed": {"$sum": "$total_agreed"},
+                    "collected": {"$sum": "$total_collected"},
+                    "projects": {"$sum": 1}
+                }}],
+                "aging": [
+                    outstanding_only,
+                    {"$group": {
+                        "_id": {"$switch": {
+                            "branches": [
+                                {"case": {"$eq": ["$due", None]}, "then": "no_due_date"},
+                                {"case": {"$gte": ["$due", now]}, "then": "current"},
+                                {"case": {"$gte": ["$due", now - timedelta(days=30)]}, "then": "1_30"},
+                                {"case": {"$gte": ["$due", now - timedelta(days=60)]}, "then": "31_60"},
+                                {"case": {"$gte": ["$due", now - timedelta(days=90)]}, "then": "61_90"}
+                            ],
+                            "default": "90_plus"
+                        }},
+                        "amount": {"$sum": "$outstanding"},
+                        "projects": {"$sum": 1}
+                    }}
+                ],
+                "top_customers": [
+                    outstanding_only,
+                    {"$group": {"_id": "$customer_name", "outstanding": {"$sum": "$outstanding"}, "projects": {"$sum": 1}}},
+                    {"$sort": {"outstanding": -1}},
+                    {"$limit": FINANCE_TOP_CUSTOMERS}
+                ]
+            }}
+        ]).to_list(1),
+        db.project_payments.aggregate([
+            {"$match": {"tenant_id": tenant_id, "payment_date": {"$gte": since}}},
+            {"$group": {
+                "_id": {"month": {"$substrCP": ["$payment_date", 0, 7]}, "method": "$payment_method"},
+                "amount": {"$sum": "$amount"},
+                "count": {"$sum": 1}
+            }},
+            {"$sort": {"_id.month": 1}}
+        ]).to_list(None)
+    )
+    
+    facets = receivables[0] if receivables else {"totals": [], "aging": [], "top_customers": []}
+    totals = facets["totals"][0] if facets["totals"] else {"agreed": 0, "collected": 0, "projects": 0}
+    aging = {bucket: {"amount": 0, "projects": 0} for bucket in FINANCE_AGING_BUCKETS}
+    for row in facets["aging"]:
+        aging[row["_id"]] = {"amount": row["amount"], "projects": row["projects"]}
+    
+    monthly = {}
+    for row in collections:
+        entry = monthly.setdefault(row["_id"]["month"], {"month": row["_id"]["month"], "total": 0, "count": 0, "by_method": {}})
+        entry["total"] += row["amount"]
+        entry["count"] += row["count"]
+        entry["by_method"][row["_id"]["method"]] = row["amount"]
+    
+    return {
+        "total_agreed": totals["agreed"],
+        "total_collected": totals["collected"],
+        "total_outstanding": totals["agreed"] - totals["collected"],
+        "project_count": totals["projects"],
+        "aging": aging,
+        "monthly_collections": list(monthly.values()),
+        "top_outstanding_customers": [
+            {"customer_name": row["_id"], "outstanding": row["outstanding"], "projects": row["projects"]}
+            for row in facets["top_customers"]
+        ],
+        "generated_at": now.isoformat()
+    }
+
+@api_router.get("/finance/report")
+async def get_finance_report(user: dict = Depends(get_current_user)):
+    check_permission(user, "projects.manage_finance")
+    tenant_id = user["tenant_id"]
+    
+    report = finance_report_cache.get(tenant_id)
+    if report is not None:
+        return report
+    
+    version = finance_versions.get(tenant_id)
+    report = await build_finance_report(tenant_id)
+    # Skip caching if a payment landed while the report was being built
+    if finance_versions.get(tenant_id) == version:
+        finance_report_cache.set(tenant_id, report)
+    return report
+
 # ==================== DASHBOARD STATS ====================
 
 @api_router.get("/dashboard/stats")
@@ -1859,8 +4053,18 @@ async def get_dashboard_stats(user: dict = Depends(get_current_user)):
     active_projects = await db.projects.count_documents({"tenant_id": tenant_id, "status": {"$in": ["planlandi", "uretimde", "montaj", "kontrol"]}})
     completed_projects = await db.projects.count_documents({"tenant_id": tenant_id, "status": "tamamlandi"})
     
-    total_tasks = await db.project_tasks.count_documents({"tenant_id": tenant_id})
-    completed_tasks = await db.project_tasks.count_documents({"tenant_id": tenant_id, "status": "tamamlandi"})
+    # Lazy areas don't store untouched tasks, so totals come from the project rollups
+    rollup_totals = await db.projects.aggregate([
+        {"$match": {"tenant_id": tenant_id, **ROLLUPS_READY}},
+        {"$group": {"_id": None, "total": {"$sum": "$task_count"}, "completed": {"$sum": "$completed_task_count"}}}
+    ]).to_list(1)
+    total_tasks = rollup_totals[0]["total"] if rollup_totals else 0
+    completed_tasks = rollup_totals[0]["completed"] if rollup_totals else 0
+    
+    legacy_ids = await db.projects.distinct("id", {"tenant_id": tenant_id, "task_count": {"$exists": False}})
+    if legacy_ids:
+        total_tasks += await db.project_tasks.count_documents({"project_id": {"$in": legacy_ids}})
+        completed_tasks += await db.project_tasks.count_documents({"project_id": {"$in": legacy_ids}, "status": "tamamlandi"})
     
     recent_projects = await db.projects.find(
         {"tenant_id": tenant_id},
@@ -1880,6 +4084,103 @@ async def get_dashboard_stats(user: dict = Depends(get_current_user)):
         "recent_projects": recent_projects
     }
 
+# ==================== ADMIN ROUTES ====================
+
+def require_admin(user: dict):
+    if not user.get("is_admin"):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Bu işlem için yönetici yetkisi gerekir"
+        )
+
+@api_router.get("/admin/metrics")
+async def get_admin_metrics(user: dict = Depends(get_current_user)):
+    require_admin(user)
+    
+    return {
+        "principal_cache": principal_cache.stats(),
+        "project_detail_cache": project_detail_cache.stats(),
+        "catalog_cache": catalog_cache.stats(),
+        "user_directory_cache": user_directory_cache.stats(),
+        "finance_report_cache": finance_report_cache.stats(),
+        "activity_writer": activity_writer.stats(),
+        "password_pool": password_pool.stats(),
+        "embedded_claims": {"enabled": JWT_EMBED_CLAIMS, **embedded_claim_stats}
+    }
+
+def hot_queries(tenant_id: str, user_id: str, project_id: Optional[str], area_id: Optional[str]) -> List[dict]:
+    queries = [
+        {"name": "users_by_email", "collection": "users", "filter": {"email": ""}},
+        {"name": "users_by_id", "collection": "users", "filter": {"id": user_id}},
+        {"name": "projects_by_tenant", "collection": "projects", "filter": {"tenant_id": tenant_id}, "sort": [("created_at", -1), ("id", -1)]},
+        {"name": "projects_by_tenant_status", "collection": "projects", "filter": {"tenant_id": tenant_id, "status": "tamamlandi"}, "sort": [("created_at", -1), ("id", -1)]},
+        {"name": "tasks_by_tenant_status", "collection": "project_tasks", "filter": {"tenant_id": tenant_id, "status": "tamamlandi"}},
+        {"name": "activities_by_tenant", "collection": "project_activities", "filter": {"tenant_id": tenant_id}, "sort": [("created_at", -1), ("id", -1)]},
+        {"name": "notifications_unread", "collection": "notifications", "filter": {"user_id": user_id, "is_read": False}, "sort": [("created_at", -1)]},
+        {"name": "assignments_by_user", "collection": "project_assignments", "filter": {"user_id": user_id}},
+    ]
+    if project_id:
+        queries += [
+            {"name": "tasks_by_project", "collection": "project_tasks", "filter": {"project_id": project_id}},
+            {"name": "areas_by_project", "collection": "project_areas", "filter": {"project_id": project_id}},
+            {"name": "payments_by_project", "collection": "project_payments", "filter": {"project_id": project_id}, "sort": [("payment_date", -1), ("id", -1)]},
+            {"name": "activities_by_project", "collection": "project_activities", "filter": {"project_id": project_id}, "sort": [("created_at", -1), ("id", -1)]},
+        ]
+    if area_id:
+        queries += [
+            {"name": "tasks_by_area", "collection": "project_tasks", "filter": {"area_id": area_id}},
+            {"name": "task_pack_by_area", "collection": "area_task_packs", "filter": {"area_id": area_id}},
+            {"name": "payments_by_area", "collection": "project_payments", "filter": {"area_id": area_id}},
+        ]
+    return queries
+
+def _plan_indexes(plan: dict) -> List[str]:
+    found = []
+    if plan.get("stage") == "COLLSCAN":
+        found.append("COLLSCAN")
+    if plan.get("indexName"):
+        found.append(plan["indexName"])
+    for key in ("inputStage", "queryPlan"):
+        if isinstance(plan.get(key), dict):
+            found += _plan_indexes(plan[key])
+    for child in plan.get("inputStages", []):
+        found += _plan_indexes(child)
+    return found
+
+@api_router.get("/admin/query-plans")
+async def get_query_plans(user: dict = Depends(get_current_user)):
+    require_admin(user)
+    
+    sample_project = await db.projects.find_one({"tenant_id": user["tenant_id"]}, {"id": 1, "_id": 0})
+    project_id = sample_project["id"] if sample_project else None
+    sample_area = await db.project_areas.find_one({"project_id": project_id}, {"id": 1, "_id": 0}) if project_id else None
+    area_id = sample_area["id"] if sample_area else None
+    
+    plans = []
+    for q in hot_queries(user["tenant_id"], user["id"], project_id, area_id):
+        cursor = db[q["collection"]].find(q["filter"])
+        if q.get("sort"):
+            cursor = cursor.sort(q["sort"])
+        explain = await cursor.explain()
+        winning_plan = explain.get("queryPlanner", {}).get("winningPlan", {})
+        execution = explain.get("executionStats", {})
+        plans.append({
+            "name": q["name"],
+            "collection": q["collection"],
+            "indexes": _plan_indexes(winning_plan),
+            "winning_plan": winning_plan,
+            "keys_examined": execution.get("totalKeysExamined"),
+            "docs_examined": execution.get("totalDocsExamined"),
+            "returned": execution.get("nReturned")
+        })
+    
+    return plans
+
+@api_router.get("/admin/indexes")
+async def get_index_report(user: dict = Depends(get_current_user)):
+    require_admin(user)
+    return await check_indexes()
+
 # ==================== WEBSOCKET ====================
 
 @app.websocket("/ws/{token}")
@@ -1888,6 +4189,8 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
         payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
         user_id = payload["user_id"]
     except:
+        # Accept first: a close before the handshake reaches the browser as 1006, not 4001
+        await websocket.accept()
         await websocket.close(code=4001)
         return
     
@@ -1906,6 +4209,7 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 logging.basicConfig(
@@ -1913,7 +4217,3 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
-
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
\ No newline at end of file
@@ -1,10 +1,13 @@
 #!/usr/bin/env python3
 
 import requests
+import os
+import subprocess
 import sys
 import json
 from datetime import datetime
 import time
+from urllib.parse import urlencode
 
 class CraftForgeAPITester:
     def __init__(self, base_url="https://woodcraft-hub-12.preview.emergentagent.com/api"):
@@ -51,6 +54,8 @@ class CraftForgeAPITester:
                 response = requests.post(url, json=data, headers=test_headers, timeout=10)
             elif method == 'PUT':
                 response = requests.put(url, json=data, headers=test_headers, timeout=10)
+            elif method == 'PATCH':
+                response = requests.patch(url, json=data, headers=test_headers, timeout=10)
             elif method == 'DELETE':
                 response = requests.delete(url, headers=test_headers, timeout=10)
 
@@ -102,6 +107,7 @@ class CraftForgeAPITester:
         
         if success and 'access_token' in response:
             self.token = response['access_token']
+            self.refresh_token = response.get('refresh_token')
             self.user_data = response['user']
             
             # Check if setup_completed is False for new user
@@ -114,6 +120,54 @@ class CraftForgeAPITester:
         
         return False
 
+    def test_refresh_token_rotation(self):
+        """Test refresh token rotation and reuse detection"""
+        print("\n🔍 Testing Refresh Token Rotation...")
+        
+        refresh_token = getattr(self, 'refresh_token', None)
+        if not refresh_token:
+            self.log_test("Refresh Token Issued", False, "", "Registration did not return a refresh token")
+            return False
+        
+        success, response = self.run_test(
+            "Refresh Session",
+            "POST",
+            "auth/refresh",
+            200,
+            data={"refresh_token": refresh_token}
+        )
+        
+        if success and 'access_token' in response:
+            self.token = response['access_token']
+            self.refresh_token = response['refresh_token']
+            
+            # A parallel tab replaying the token right after rotation stays signed in
+            self.run_test(
+                "Accept Rotated Refresh Token Within Grace",
+                "POST",
+                "auth/refresh",
+                200,
+                data={"refresh_token": refresh_token}
+            )
+            
+            # Once the family is ended the rotated token must not be accepted again
+            self.run_test(
+                "Logout Session Family",
+                "POST",
+                "auth/logout",
+                200,
+                data={"refresh_token": self.refresh_token}
+            )
+            self.run_test(
+                "Reject Rotated Refresh Token",
+                "POST",
+                "auth/refresh",
+                401,
+                data={"refresh_token": refresh_token}
+            )
+        
+        return success
+
     def test_tenant_operations(self):
         """Test tenant CRUD operations with new fields"""
         print("\n🔍 Testing Tenant Operations...")
@@ -299,6 +353,44 @@ class CraftForgeAPITester:
         
         return success
 
+    def test_tenant_templates(self):
+        """Test custom tenant templates can be saved and applied"""
+        print("\n🔍 Testing Tenant Templates...")
+        
+        success, _ = self.run_test(
+            "Create Tenant Template",
+            "POST",
+            "tenant-templates",
+            200,
+            data={
+                "key": "mine",
+                "name": "Test Şablonu",
+                "groups": [{"name": "Şablon Grubu", "subtasks": ["Ölçü", "Kesim"]}],
+                "workitems": ["Şablon Kalemi"]
+            }
+        )
+        
+        if success:
+            success, result = self.run_test(
+                "Apply Tenant Template",
+                "POST",
+                "tenant-templates/mine/apply",
+                200
+            )
+            
+            if success:
+                _, groups = self.run_test("Get Groups After Apply", "GET", "groups", 200)
+                applied = any(g["name"] == "Şablon Grubu" for g in groups or [])
+                self.log_test("Template Groups Applied", applied, f"Added {result.get('groups')} groups", "" if applied else "Template group missing")
+                
+                # Re-applying skips what is already in the catalog
+                _, again = self.run_test("Reapply Tenant Template", "POST", "tenant-templates/mine/apply", 200)
+                self.log_test("Template Reapply Skips Existing", again.get("groups") == 0, "No duplicate groups", "" if again.get("groups") == 0 else f"Added {again.get('groups')} groups")
+            
+            self.run_test("Delete Tenant Template", "DELETE", "tenant-templates/mine", 200)
+        
+        return success
+
     def test_roles_and_permissions(self):
         """Test roles and permissions"""
         print("\n🔍 Testing Roles and Permissions...")
@@ -438,6 +530,17 @@ class CraftForgeAPITester:
                 else:
                     self.log_test("Project Areas Created", False, "", "Areas not created properly")
                 
+                # Search runs server-side, so a single page still finds the project by customer name
+                success, found = self.run_test(
+                    "Search Projects",
+                    "GET",
+                    f"projects?{urlencode({'search': project_data['customer_name'], 'limit': 1})}",
+                    200
+                )
+                if success:
+                    matched = any(p["id"] == project_id for p in found)
+                    self.log_test("Project Search", matched, "Project found by customer name", "" if matched else "Project missing from search results")
+                
                 return True
         
         self.log_test("Project with Areas Test", False, "", "Insufficient work items or creation failed")
@@ -507,6 +610,24 @@ class CraftForgeAPITester:
         
         return False
 
+    def test_finance_report(self):
+        """Test tenant finance report endpoint"""
+        print("\n🔍 Testing Finance Report...")
+        
+        success, report = self.run_test(
+            "Get Finance Report",
+            "GET",
+            "finance/report",
+            200
+        )
+        
+        if success:
+            expected_fields = ['total_agreed', 'total_collected', 'aging', 'monthly_collections', 'top_outstanding_customers']
+            missing_fields = [f for f in expected_fields if f not in report]
+            self.log_test("Finance Report Fields", not missing_fields, "All expected fields present", f"Missing fields: {missing_fields}" if missing_fields else "")
+        
+        return success
+
     def test_project_assignments(self):
         """Test project staff assignment functionality"""
         print("\n🔍 Testing Project Assignments...")
@@ -588,6 +709,17 @@ class CraftForgeAPITester:
                     missing_fields = [f for f in expected_fields if f not in activity]
                     self.log_test("Activity Structure", False, "", f"Missing fields: {missing_fields}")
             
+            success, feed = self.run_test(
+                "Get Tenant Activity Feed",
+                "GET",
+                "activities?action=project_created&limit=5",
+                200
+            )
+            
+            if success:
+                only_created = all(a.get("action") == "project_created" for a in feed)
+                self.log_test("Tenant Activity Filter", only_created, f"Found {len(feed)} activities", "" if only_created else "Unexpected action in filtered feed")
+            
             return True
         
         return False
@@ -629,11 +761,179 @@ class CraftForgeAPITester:
                 
                 if success:
                     self.log_test("Project Task Update", True, "Task updated successfully")
+                
+                success, result = self.run_test(
+                    "Bulk Update Project Tasks",
+                    "PATCH",
+                    f"projects/{self.project_id}/tasks",
+                    200,
+                    data={"tasks": [{"id": t["id"], "status": "montaj"} for t in tasks[:3]]}
+                )
+                
+                if success:
+                    updated = len(result.get("updated", []))
+                    self.log_test("Bulk Task Update", updated == len(tasks[:3]), f"Updated {updated} tasks", "" if updated == len(tasks[:3]) else f"Conflicts: {result.get('conflicts')}")
+                
+                self.run_test(
+                    "Reject Unknown Task Status",
+                    "PUT",
+                    f"projects/{self.project_id}/tasks/{task_id}",
+                    400,
+                    data={"status": "bilinmiyor"}
+                )
             
             return True
         
         return False
 
+    def check_rollups(self, label):
+        """Compare stored project/area rollups against tasks and payments read from source"""
+        _, project = self.run_test(f"Get Project ({label})", "GET", f"projects/{self.project_id}", 200)
+        _, tasks = self.run_test(f"Get Tasks ({label})", "GET", f"projects/{self.project_id}/tasks", 200)
+        _, payments = self.run_test(f"Get Payments ({label})", "GET", f"projects/{self.project_id}/payments?limit=500", 200)
+        if not project:
+            return False
+        
+        problems = []
+        areas = project.get("areas", [])
+        for area in areas:
+            area_tasks = [t for t in tasks if t["area_id"] == area["id"]]
+            expected_counts = {}
+            for task in area_tasks:
+                expected_counts[task["status"]] = expected_counts.get(task["status"], 0) + 1
+            stored_counts = {k: v for k, v in (area.get("status_counts") or {}).items() if v}
+            collected = sum(p["amount"] for p in payments if p["area_id"] == area["id"])
+            
+            if area.get("task_count") != len(area_tasks):
+                problems.append(f"{area['name']} task_count {area.get('task_count')} != {len(area_tasks)}")
+            if "status_counts" in area and stored_counts != expected_counts:
+                problems.append(f"{area['name']} status_counts {stored_counts} != {expected_counts}")
+            if abs(area.get("collected_amount", 0) - collected) > 0.01:
+                problems.append(f"{area['name']} collected {area.get('collected_amount')} != {collected}")
+        
+        completed = sum(1 for t in tasks if t["status"] == "tamamlandi")
+        expected_progress = (completed / len(tasks) * 100) if tasks else 0
+        total_agreed = sum(a.get("agreed_price", 0) for a in areas)
+        total_collected = sum(p["amount"] for p in payments)
+        
+        if project.get("area_count") != len(areas):
+            problems.append(f"area_count {project.get('area_count')} != {len(areas)}")
+        if abs(project.get("progress", 0) - expected_progress) > 0.01:
+            problems.append(f"progress {project.get('progress')} != {expected_progress}")
+        if abs(project["finance"]["total_agreed"] - total_agreed) > 0.01:
+            problems.append(f"total_agreed {project['finance']['total_agreed']} != {total_agreed}")
+        if abs(project["finance"]["total_collected"] - total_collected) > 0.01:
+            problems.append(f"total_collected {project['finance']['total_collected']} != {total_collected}")
+        
+        self.log_test(f"Rollups Consistent ({label})", not problems, "Rollups match source", "; ".join(problems))
+        return not problems
+
+    def test_project_rollups(self):
+        """Test project/area rollups stay correct across task, payment and area changes"""
+        print("\n🔍 Testing Project Rollups...")
+        
+        if not hasattr(self, 'project_id'):
+            self.log_test("Project Rollups Test", False, "", "No project available for testing")
+            return False
+        
+        self.check_rollups("initial")
+        
+        _, work_items = self.run_test("Get Work Items for Rollups", "GET", "workitems", 200)
+        if not work_items:
+            return False
+        
+        success, area = self.run_test(
+            "Create Area for Rollups",
+            "POST",
+            f"projects/{self.project_id}/areas",
+            200,
+            data={
+                "name": "Rollup Alanı",
+                "work_items": [{"work_item_id": work_items[0]["id"], "work_item_name": work_items[0]["name"], "quantity": 1}],
+                "agreed_price": 10000.0
+            }
+        )
+        if not success:
+            return False
+        area_id = area["id"]
+        self.check_rollups("area created")
+        
+        self.run_test("Update Area Price", "PUT", f"projects/{self.project_id}/areas/{area_id}", 200, data={"agreed_price": 12000.0})
+        self.check_rollups("area updated")
+        
+        success, payment = self.run_test(
+            "Add Payment for Rollups",
+            "POST",
+            f"projects/{self.project_id}/payments",
+            200,
+            data={"area_id": area_id, "amount": 3000.0, "payment_date": "2024-02-01", "payment_method": "nakit"}
+        )
+        self.check_rollups("payment added")
+        
+        _, tasks = self.run_test("Get Tasks for Rollups", "GET", f"projects/{self.project_id}/tasks?area_id={area_id}", 200)
+        if tasks:
+            self.run_test("Complete Task for Rollups", "PUT", f"projects/{self.project_id}/tasks/{tasks[0]['id']}", 200, data={"status": "tamamlandi"})
+            self.check_rollups("task completed")
+        
+        if success:
+            self.run_test("Delete Payment for Rollups", "DELETE", f"projects/{self.project_id}/payments/{payment['id']}", 200)
+            self.check_rollups("payment deleted")
+        
+        self.run_test("Delete Area for Rollups", "DELETE", f"projects/{self.project_id}/areas/{area_id}", 200)
+        return self.check_rollups("area deleted")
+
+    def run_migrate_tasks(self, manage_py, target):
+        """Run manage.py migrate-tasks for the test project"""
+        result = subprocess.run(
+            [sys.executable, manage_py, "migrate-tasks", "--to", target, "--project", self.project_id],
+            capture_output=True, text=True, timeout=120
+        )
+        self.log_test(f"Migrate Tasks to {target}", result.returncode == 0, result.stdout.strip(), result.stderr.strip())
+        return result.returncode == 0
+
+    def snapshot_tasks(self, label):
+        _, tasks = self.run_test(f"Get Tasks ({label})", "GET", f"projects/{self.project_id}/tasks", 200)
+        return {t["id"]: (t["status"], t.get("notes"), t.get("assigned_to")) for t in tasks or []}
+
+    def test_task_storage_migration(self):
+        """Test migrate-tasks round-trips documents -> packed -> documents without losing task state"""
+        print("\n🔍 Testing Task Storage Migration...")
+        
+        # The CLI talks to MongoDB directly, so this only runs next to the API's database
+        manage_py = os.environ.get("CRAFTFORGE_MANAGE_PY")
+        if not manage_py:
+            print("⏭️  Skipped: set CRAFTFORGE_MANAGE_PY to the backend's manage.py to run")
+            return True
+        if not hasattr(self, 'project_id'):
+            self.log_test("Task Storage Migration Test", False, "", "No project available for testing")
+            return False
+        
+        _, tasks = self.run_test("Get Tasks for Migration", "GET", f"projects/{self.project_id}/tasks", 200)
+        if not tasks:
+            return False
+        self.run_test(
+            "Edit Task Before Migration",
+            "PUT",
+            f"projects/{self.project_id}/tasks/{tasks[0]['id']}",
+            200,
+            data={"status": "kontrol", "notes": "Taşıma öncesi not"}
+        )
+        before = self.snapshot_tasks("before migration")
+        
+        for target in ("packed", "documents"):
+            if not self.run_migrate_tasks(manage_py, target):
+                return False
+            after = self.snapshot_tasks(f"after {target}")
+            changed = [task_id for task_id in before if after.get(task_id) != before[task_id]]
+            preserved = not changed and len(after) == len(before)
+            self.log_test(
+                f"Tasks Preserved ({target})", preserved, f"{len(after)} tasks unchanged",
+                "" if preserved else f"{len(changed)} changed, {len(after)} of {len(before)} present"
+            )
+            self.check_rollups(f"after {target}")
+        
+        return True
+
     def test_dashboard_stats(self):
         """Test dashboard statistics endpoint"""
         print("\n🔍 Testing Dashboard Stats...")
@@ -657,6 +957,29 @@ class CraftForgeAPITester:
         
         return success
 
+    def test_admin_metrics(self):
+        """Test admin cache metrics endpoint"""
+        print("\n🔍 Testing Admin Metrics...")
+        
+        # Warm the principal cache with an authenticated call first
+        self.run_test("Warm Principal Cache", "GET", "auth/me", 200)
+        
+        success, metrics = self.run_test(
+            "Get Admin Metrics",
+            "GET",
+            "admin/metrics",
+            200
+        )
+        
+        if success:
+            cache_stats = metrics.get('principal_cache', {})
+            if cache_stats.get('hits', 0) > 0:
+                self.log_test("Principal Cache Hits", True, f"Hits: {cache_stats['hits']}")
+            else:
+                self.log_test("Principal Cache Hits", False, "", "Expected cache hits after repeated requests")
+        
+        return success
+
     def run_all_tests(self):
         """Run all tests"""
         print("🚀 Starting CraftForge API Tests...")
@@ -665,18 +988,24 @@ class CraftForgeAPITester:
         # Test sequence
         tests = [
             self.test_user_registration,
+            self.test_refresh_token_rotation,
             self.test_tenant_operations,
             self.test_groups_and_subtasks,
             self.test_work_items,
+            self.test_tenant_templates,
             self.test_roles_and_permissions,
             self.test_setup_wizard_completion,
             self.test_user_auth_flow,
             self.test_project_with_areas,
             self.test_project_payments,
+            self.test_finance_report,
             self.test_project_assignments,
             self.test_project_activities,
             self.test_project_tasks,
+            self.test_project_rollups,
+            self.test_task_storage_migration,
             self.test_dashboard_stats,
+            self.test_admin_metrics,
         ]
         
         for test in tests:
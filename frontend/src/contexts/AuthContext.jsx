@@ -1,4 +1,4 @@
-import { createContext, useContext, useState, useEffect } from "react";
+import { createContext, useContext, useState, useEffect, useCallback } from "react";
 import axios from "axios";
 
 const AuthContext = createContext(null);
@@ -13,6 +13,40 @@ export const useAuth = () => {
   return context;
 };
 
+const storeTokens = (accessToken, refreshToken) => {
+  localStorage.setItem("token", accessToken);
+  if (refreshToken) {
+    localStorage.setItem("refresh_token", refreshToken);
+  }
+};
+
+const clearTokens = () => {
+  localStorage.removeItem("token");
+  localStorage.removeItem("refresh_token");
+};
+
+// Tüm yenileme istekleri (axios, WebSocket) aynı isteği paylaşır; refresh token bir kez döndürülür
+let refreshPromise = null;
+
+const requestRefresh = () => {
+  const refreshToken = localStorage.getItem("refresh_token");
+  if (!refreshToken) {
+    return Promise.reject(new Error("Refresh token yok"));
+  }
+  if (!refreshPromise) {
+    refreshPromise = axios
+      .post(`${API_URL}/auth/refresh`, { refresh_token: refreshToken })
+      .then(({ data }) => {
+        storeTokens(data.access_token, data.refresh_token);
+        return data.access_token;
+      })
+      .finally(() => {
+        refreshPromise = null;
+      });
+  }
+  return refreshPromise;
+};
+
 export const AuthProvider = ({ children }) => {
   const [user, setUser] = useState(null);
   const [token, setToken] = useState(localStorage.getItem("token"));
@@ -27,6 +61,51 @@ export const AuthProvider = ({ children }) => {
     }
   }, [token]);
 
+  // Yeni erişim token'ı döner; yenileme başarısızsa oturumu kapatır ve null döner
+  const refreshSession = useCallback(async () => {
+    try {
+      const accessToken = await requestRefresh();
+      axios.defaults.headers.common["Authorization"] = `Bearer ${accessToken}`;
+      setToken(accessToken);
+      return accessToken;
+    } catch (refreshError) {
+      clearTokens();
+      setToken(null);
+      setUser(null);
+      return null;
+    }
+  }, []);
+
+  // Kısa ömürlü erişim token'ı dolduğunda refresh token ile yenile ve isteği tekrarla
+  useEffect(() => {
+    const interceptor = axios.interceptors.response.use(
+      (response) => response,
+      async (error) => {
+        const original = error.config;
+        const refreshToken = localStorage.getItem("refresh_token");
+        if (
+          error.response?.status !== 401 ||
+          !refreshToken ||
+          !original ||
+          original._retried ||
+          /\/auth\/(login|register|refresh|logout)$/.test(original.url || "")
+        ) {
+          return Promise.reject(error);
+        }
+
+        original._retried = true;
+        const accessToken = await refreshSession();
+        if (!accessToken) {
+          return Promise.reject(error);
+        }
+        original.headers["Authorization"] = `Bearer ${accessToken}`;
+        return axios(original);
+      }
+    );
+
+    return () => axios.interceptors.response.eject(interceptor);
+  }, [refreshSession]);
+
   // Check token and load user
   useEffect(() => {
     const loadUser = async () => {
@@ -40,7 +119,7 @@ export const AuthProvider = ({ children }) => {
         setUser(response.data);
       } catch (error) {
         console.error("Failed to load user:", error);
-        localStorage.removeItem("token");
+        clearTokens();
         setToken(null);
         setUser(null);
       } finally {
@@ -56,8 +135,8 @@ export const AuthProvider = ({ children }) => {
       email,
       password,
     });
-    const { access_token, user: userData } = response.data;
-    localStorage.setItem("token", access_token);
+    const { access_token, refresh_token, user: userData } = response.data;
+    storeTokens(access_token, refresh_token);
     setToken(access_token);
     setUser(userData);
     return userData;
@@ -70,15 +149,19 @@ export const AuthProvider = ({ children }) => {
       full_name: fullName,
       tenant_name: tenantName,
     });
-    const { access_token, user: userData } = response.data;
-    localStorage.setItem("token", access_token);
+    const { access_token, refresh_token, user: userData } = response.data;
+    storeTokens(access_token, refresh_token);
     setToken(access_token);
     setUser(userData);
     return userData;
   };
 
   const logout = () => {
-    localStorage.removeItem("token");
+    const refreshToken = localStorage.getItem("refresh_token");
+    if (refreshToken) {
+      axios.post(`${API_URL}/auth/logout`, { refresh_token: refreshToken }).catch(() => {});
+    }
+    clearTokens();
     setToken(null);
     setUser(null);
   };
@@ -119,6 +202,7 @@ export const AuthProvider = ({ children }) => {
     logout,
     updateUser,
     refreshUser,
+    refreshSession,
     hasPermission, // Context'e ekledik
     isAuthenticated: !!user,
   };
@@ -7,6 +7,9 @@ const NotificationContext = createContext(null);
 
 const API_URL = process.env.REACT_APP_BACKEND_URL + "/api";
 const WS_URL = process.env.REACT_APP_BACKEND_URL?.replace("https://", "wss://").replace("http://", "ws://");
+const WS_RECONNECT_BASE_MS = 3000;
+const WS_RECONNECT_MAX_MS = 60000;
+const WS_AUTH_FAILED = 4001;
 
 export const useNotifications = () => {
   const context = useContext(NotificationContext);
@@ -17,7 +20,7 @@ export const useNotifications = () => {
 };
 
 export const NotificationProvider = ({ children }) => {
-  const { token, isAuthenticated } = useAuth();
+  const { token, isAuthenticated, refreshSession } = useAuth();
   const [notifications, setNotifications] = useState([]);
   const [unreadCount, setUnreadCount] = useState(0);
   const [ws, setWs] = useState(null);
@@ -80,11 +83,20 @@ export const NotificationProvider = ({ children }) => {
       return;
     }
 
+    let websocket = null;
+    let reconnectTimer = null;
+    let reconnectAttempts = 0;
+    let stopped = false;
+
     const connectWebSocket = () => {
-      const websocket = new WebSocket(`${WS_URL}/ws/${token}`);
+      // Access tokens rotate on refresh, so always connect with the latest stored one
+      const currentToken = localStorage.getItem("token");
+      if (!currentToken) return;
+      websocket = new WebSocket(`${WS_URL}/ws/${currentToken}`);
 
       websocket.onopen = () => {
         console.log("WebSocket connected");
+        reconnectAttempts = 0;
       };
 
       websocket.onmessage = (event) => {
@@ -105,14 +117,22 @@ export const NotificationProvider = ({ children }) => {
         }
       };
 
-      websocket.onclose = () => {
+      websocket.onclose = (event) => {
         console.log("WebSocket disconnected");
-        // Reconnect after 3 seconds
-        setTimeout(() => {
-          if (isAuthenticated && token) {
-            connectWebSocket();
-          }
-        }, 3000);
+        if (stopped) return;
+
+        if (event.code === WS_AUTH_FAILED) {
+          // Expired token: refresh through the shared flow. A new token re-runs this effect and
+          // reconnects; a failed refresh logs out, which stops it.
+          stopped = true;
+          refreshSession();
+          return;
+        }
+
+        // Exponential backoff so a down server is not hammered every few seconds
+        const delay = Math.min(WS_RECONNECT_BASE_MS * 2 ** reconnectAttempts, WS_RECONNECT_MAX_MS);
+        reconnectAttempts += 1;
+        reconnectTimer = setTimeout(connectWebSocket, delay);
       };
 
       websocket.onerror = (error) => {
@@ -125,11 +145,13 @@ export const NotificationProvider = ({ children }) => {
     connectWebSocket();
 
     return () => {
-      if (ws) {
-        ws.close();
+      stopped = true;
+      clearTimeout(reconnectTimer);
+      if (websocket) {
+        websocket.close();
       }
     };
-  }, [isAuthenticated, token]);
+  }, [isAuthenticated, token, refreshSession]);
 
   // Initial fetch
   useEffect(() => {
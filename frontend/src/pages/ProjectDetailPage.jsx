@@ -95,7 +95,11 @@ export default function ProjectDetailPage() {
   // Data States
   const [project, setProject] = useState(null);
   const [activities, setActivities] = useState([]);
+  const [activitiesCursor, setActivitiesCursor] = useState(null);
+  const [loadingMoreActivities, setLoadingMoreActivities] = useState(false);
   const [payments, setPayments] = useState([]);
+  const [paymentsCursor, setPaymentsCursor] = useState(null);
+  const [loadingMorePayments, setLoadingMorePayments] = useState(false);
   const [tasks, setTasks] = useState([]);
   const [users, setUsers] = useState([]);
   const [taskFiles, setTaskFiles] = useState([]); 
@@ -155,14 +159,38 @@ export default function ProjectDetailPage() {
     try {
       const res = await axios.get(`${API_URL}/projects/${projectId}/activities`);
       setActivities(res.data);
+      setActivitiesCursor(res.headers["x-next-cursor"] || null);
     } catch (e) { console.error("Aktiviteler çekilemedi"); }
   };
 
+  const fetchMoreActivities = async () => {
+    if (!activitiesCursor) return;
+    setLoadingMoreActivities(true);
+    try {
+      const res = await axios.get(`${API_URL}/projects/${projectId}/activities`, { params: { cursor: activitiesCursor } });
+      setActivities((prev) => [...prev, ...res.data]);
+      setActivitiesCursor(res.headers["x-next-cursor"] || null);
+    } catch (e) { console.error("Aktiviteler çekilemedi"); }
+    finally { setLoadingMoreActivities(false); }
+  };
+
   const fetchPayments = async () => {
     try {
       const res = await axios.get(`${API_URL}/projects/${projectId}/payments`);
       setPayments(res.data);
+      setPaymentsCursor(res.headers["x-next-cursor"] || null);
+    } catch (e) { console.error("Ödemeler çekilemedi"); }
+  };
+
+  const fetchMorePayments = async () => {
+    if (!paymentsCursor) return;
+    setLoadingMorePayments(true);
+    try {
+      const res = await axios.get(`${API_URL}/projects/${projectId}/payments`, { params: { cursor: paymentsCursor } });
+      setPayments((prev) => [...prev, ...res.data]);
+      setPaymentsCursor(res.headers["x-next-cursor"] || null);
     } catch (e) { console.error("Ödemeler çekilemedi"); }
+    finally { setLoadingMorePayments(false); }
   };
 
   const fetchUsers = async () => {
@@ -716,6 +744,13 @@ export default function ProjectDetailPage() {
                                 ))}
                             </div>
                         )}
+                        {paymentsCursor && (
+                            <div className="flex justify-center p-4">
+                                <Button variant="outline" size="sm" onClick={fetchMorePayments} disabled={loadingMorePayments}>
+                                    {loadingMorePayments ? "Yükleniyor..." : "Daha Fazla Yükle"}
+                                </Button>
+                            </div>
+                        )}
                     </ScrollArea>
                 </CardContent>
             </Card>
@@ -756,6 +791,13 @@ export default function ProjectDetailPage() {
                                 )
                             })}
                         </div>
+                        {activitiesCursor && (
+                            <div className="flex justify-center pt-6">
+                                <Button variant="outline" size="sm" onClick={fetchMoreActivities} disabled={loadingMoreActivities}>
+                                    {loadingMoreActivities ? "Yükleniyor..." : "Daha Fazla Yükle"}
+                                </Button>
+                            </div>
+                        )}
                     </ScrollArea>
                 </CardContent>
             </Card>
@@ -33,20 +33,30 @@ export default function ProjectsPage() {
   const [projects, setProjects] = useState([]);
   const [loading, setLoading] = useState(true);
   const [searchTerm, setSearchTerm] = useState("");
+  const [debouncedSearch, setDebouncedSearch] = useState("");
   const [statusFilter, setStatusFilter] = useState("active"); // active, stopped, completed
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+
+  // Arama sunucuda yapılır; her tuşta istek atmamak için kısa bir gecikme
+  useEffect(() => {
+    const timer = setTimeout(() => setDebouncedSearch(searchTerm.trim()), 300);
+    return () => clearTimeout(timer);
+  }, [searchTerm]);
 
   useEffect(() => {
     fetchProjects();
-  }, [statusFilter]); // Filtre değişince yeniden çek
+  }, [statusFilter, debouncedSearch]); // Filtre veya arama değişince imleci sıfırlayıp yeniden çek
 
   const fetchProjects = async () => {
     setLoading(true);
     try {
       // Backend'e status parametresi gönderiyoruz
       const response = await axios.get(`${API_URL}/projects`, {
-        params: { status: statusFilter }
+        params: { status: statusFilter, search: debouncedSearch || undefined }
       });
       setProjects(response.data);
+      setNextCursor(response.headers["x-next-cursor"] || null);
     } catch (error) {
       console.error("Projeler yüklenirken hata:", error);
     } finally {
@@ -54,11 +64,22 @@ export default function ProjectsPage() {
     }
   };
 
-  const filteredProjects = projects.filter(
-    (p) =>
-      p.name.toLowerCase().includes(searchTerm.toLowerCase()) ||
-      p.customer_name?.toLowerCase().includes(searchTerm.toLowerCase())
-  );
+  // Sonraki sayfayı imleç ile çek ve listeye ekle
+  const fetchMoreProjects = async () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    try {
+      const response = await axios.get(`${API_URL}/projects`, {
+        params: { status: statusFilter, search: debouncedSearch || undefined, cursor: nextCursor }
+      });
+      setProjects((prev) => [...prev, ...response.data]);
+      setNextCursor(response.headers["x-next-cursor"] || null);
+    } catch (error) {
+      console.error("Projeler yüklenirken hata:", error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
 
   const getStatusBadge = (status) => {
     const styles = {
@@ -141,14 +162,14 @@ export default function ProjectsPage() {
                   Yükleniyor...
                 </TableCell>
               </TableRow>
-            ) : filteredProjects.length === 0 ? (
+            ) : projects.length === 0 ? (
               <TableRow>
                 <TableCell colSpan={7} className="h-24 text-center text-muted-foreground">
                   Proje bulunamadı.
                 </TableCell>
               </TableRow>
             ) : (
-              filteredProjects.map((project) => (
+              projects.map((project) => (
                 <TableRow 
                   key={project.id} 
                   className="cursor-pointer hover:bg-muted/50"
@@ -200,6 +221,14 @@ export default function ProjectsPage() {
           </TableBody>
         </Table>
       </div>
+
+      {nextCursor && !loading && (
+        <div className="flex justify-center">
+          <Button variant="outline" onClick={fetchMoreProjects} disabled={loadingMore}>
+            {loadingMore ? "Yükleniyor..." : "Daha Fazla Yükle"}
+          </Button>
+        </div>
+      )}
     </div>
   );
 }
\ No newline at end of file